@@ -3,6 +3,7 @@ from taubsi.core.config_classes import *
 
 class Config(BaseConfig):
     TRASH_CHANNEL_ID = 124556432123  # ID of a channel to upload pictures to
+    IMAGE_SERVER_URL = ""  # e.g. "https://images.example.com" to serve pictures yourself instead (port 8080)
     TRASH_GUILD_ID = 1234567899  # ID of a server to upload emojis to
     LANGUAGE = Language.GERMAN  # Language.ENGLISH / Language.GERMAN
     BOT_TOKEN = ""  # Your Discord Bot Token
@@ -14,6 +15,8 @@ class Config(BaseConfig):
     DB_PORT = 3306
     DB_USER = ""
     DB_PASS = ""
+    DB_POOL_MIN_SIZE = 1
+    DB_POOL_MAX_SIZE = 10
 
     # Dmap section
     TILESERVER_URL = "https://tiles.map.com/"
@@ -26,7 +29,7 @@ class Config(BaseConfig):
     ]
 
     SERVERS = [
-        Server(name="Server name", id_=12329038108391, geofence="fence name",
+        Server(name="Server name", id_=12329038108391, geofence="fence name",  # or a list of fence names
                raid_channels=[
                    RaidChannel(id_=132423131313, level=5),
                    RaidChannel(id_=432131342313, level=6)
@@ -0,0 +1,137 @@
+"""
+Compares PogoData's proto enum parsing, game master classification and enum lookups
+with the implementations they replaced. Runs on synthetic data, so it needs no network, no config
+and none of the bot's dependencies.
+
+    python scripts/bench_pogodata.py
+"""
+import importlib.util
+import os
+import random
+import re
+import timeit
+from enum import Enum
+from typing import Union, List
+
+# loaded by path, importing the taubsi package would start the bot
+ENUM_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "taubsi", "pogodata", "enum.py")
+_spec = importlib.util.spec_from_file_location("pogodata_enum", ENUM_FILE)
+pogodata_enum = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(pogodata_enum)
+
+ENUM_SIZES = {"HoloPokemonId": 1010, "Form": 3200, "HoloTemporaryEvolutionId": 6, "HoloPokemonMove": 450,
+              "HoloPokemonType": 19, "WeatherCondition": 8}
+
+
+class OldEnum(Enum):
+    @classmethod
+    def get(cls, value: Union[str, int]):
+        enum_list = list(cls)
+        if isinstance(value, str) and value.upper() in [e.name for e in enum_list]:
+            return cls[value.upper()]
+        elif isinstance(value, int) and value in [e.value for e in enum_list]:
+            return cls(value)
+        else:
+            return enum_list[0]
+
+
+def old_convert_enum(protos: str, enum: str) -> OldEnum:
+    proto = re.findall(f"enum {enum} " + r"{[^}]*}", protos, re.IGNORECASE)
+    final = []
+    for entry in proto[0].split("\n"):
+        if "}" in entry or "{" in entry:
+            continue
+        entry = entry.replace(" ", "").replace(";", "").split("=")
+        final.append((entry[0].strip(), int(entry[1].strip())))
+    return OldEnum(enum, final)
+
+
+def old_classify(templates: List[str]) -> List[int]:
+    result = [0, 0]
+    for template in templates:
+        if re.search(r"^V\d{4}_POKEMON_", template):
+            result[0] += 1
+        elif re.search(r"^COMBAT_V\d{4}_MOVE_", template):
+            result[1] += 1
+    return result
+
+
+def new_classify(templates: List[str]) -> List[int]:
+    result = [0, 0]
+    for template in templates:
+        template_type = pogodata_enum.classify_template(template)
+        if template_type is pogodata_enum.TemplateType.POKEMON:
+            result[0] += 1
+        elif template_type is pogodata_enum.TemplateType.MOVE:
+            result[1] += 1
+    return result
+
+
+def make_protos() -> str:
+    """
+    ~3000 messages and enums, with the wanted enums at random places
+    """
+    parts = []
+    for i in range(3000):
+        if i % 3:
+            parts.append(f"message Msg{i}Proto {{\n" + "".join(f"\tint32 field_{j} = {j};\n" for j in range(20))
+                         + "}\n")
+        else:
+            parts.append(f"enum Other{i} {{\n" + "".join(f"\tOTHER_{i}_{j} = {j};\n" for j in range(15)) + "}\n")
+    for pos, (name, size) in zip(random.sample(range(3000), len(ENUM_SIZES)), ENUM_SIZES.items()):
+        parts.insert(pos, f"enum {name} {{\n" + "".join(f"\t{name.upper()}_{j} = {j};\n" for j in range(size))
+                     + "}\n")
+    return "".join(parts)
+
+
+def make_templates() -> List[str]:
+    """
+    16k templates, ~1600 pokemon and ~450 moves
+    """
+    templates = []
+    for i in range(16000):
+        if i % 10 == 0:
+            templates.append(f"V{i % 1000:04d}_POKEMON_MON_{i}")
+        elif i % 10 == 1 and i < 4500:
+            templates.append(f"COMBAT_V{i % 1000:04d}_MOVE_MOVE_{i}")
+        else:
+            templates.append(f"ITEM_SOMETHING_{i}_V{i:04d}")
+    return templates
+
+
+def best_ms(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1000
+
+
+def main():
+    random.seed(1)
+    protos = make_protos()
+    templates = make_templates()
+
+    old_enums = {name: old_convert_enum(protos, name) for name in ENUM_SIZES}
+    new_enums = pogodata_enum.convert_enums(protos, list(ENUM_SIZES))
+    for name in ENUM_SIZES:
+        assert [(e.name, e.value) for e in old_enums[name]] == [(e.name, e.value) for e in new_enums[name]]
+    assert old_classify(templates) == new_classify(templates)
+
+    # about the lookups done while parsing: 2 per pokemon, 1 per move, 1 per form translation
+    lookups = ([("HoloPokemonId", f"HOLOPOKEMONID_{random.randrange(1010)}"),
+                ("Form", f"FORM_{random.randrange(3200)}")] * 1600
+               + [("HoloPokemonMove", f"HOLOPOKEMONMOVE_{random.randrange(450)}")] * 450
+               + [("Form", f"FORM_{random.randrange(3200)}")] * 3000)
+
+    def lookup(enums):
+        for name, value in lookups:
+            enums[name].get(value)
+
+    print(f"protos: {len(protos) / 1e6:.1f} MB, {len(templates)} templates, {len(lookups)} enum lookups")
+    print(f"enums     old {best_ms(lambda: [old_convert_enum(protos, n) for n in ENUM_SIZES], 5):8.1f} ms"
+          f"   new {best_ms(lambda: pogodata_enum.convert_enums(protos, list(ENUM_SIZES)), 5):8.1f} ms")
+    print(f"classify  old {best_ms(lambda: old_classify(templates), 5):8.1f} ms"
+          f"   new {best_ms(lambda: new_classify(templates), 5):8.1f} ms")
+    print(f"lookups   old {best_ms(lambda: lookup(old_enums), 1):8.1f} ms"
+          f"   new {best_ms(lambda: lookup(new_enums), 1):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import discord
 from discord.ext import commands, tasks
 
 from taubsi.core import log
+from taubsi.core.queries import Query
 from taubsi.cogs.setup.objects import TaubsiUser
 
 if TYPE_CHECKING:
@@ -12,18 +13,19 @@ if TYPE_CHECKING:
 class AutoSetupCog(commands.Cog):
     def __init__(self, bot):
         self.bot: TaubsiBot = bot
+        self.outdated_users_query = Query(
+            "outdated_users",
+            f"SELECT user_id, u.name, t.level, t.team FROM users u "
+            f"LEFT JOIN {self.bot.config.MAD_DB_NAME}.cev_trainer t ON t.name = u.ingame_name "
+            f"WHERE t.level > u.level OR t.team != u.team_id"
+        )
 
     async def final_init(self):
         self.autoupdate_loop.start()
 
     @tasks.loop(hours=1)
     async def autoupdate_loop(self):
-        query = (
-            f"select user_id, u.name, t.level, t.team from users u "
-            f"left join {self.bot.config.MAD_DB_NAME}.cev_trainer t on t.name = u.ingame_name "
-            f"where t.level > u.level or t.team != u.team_id"
-        )
-        result = await self.bot.taubsi_db.execute(query, as_dict=False)
+        result = await self.bot.taubsi_db.execute(self.outdated_users_query, as_dict=False)
         if len(result) == 0:
             return
 
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import math
 from typing import List, Optional, Dict, TYPE_CHECKING
 
@@ -9,11 +10,15 @@ import discord
 
 from taubsi.cogs.dmap.map_pages import MapNavPage, SettingsPage, StartRaidPage, MapPage
 from taubsi.cogs.dmap.usersettings import UserSettings
-from taubsi.core import bot, Gym, log
+from taubsi.core import bot, Gym, Server, log
+from taubsi.core.queries import Query
+from taubsi.utils import http
 
 if TYPE_CHECKING:
     from taubsi.core.uicons import UIcon
 
+DMAP_SETTINGS_QUERY = Query("dmap_settings", "SELECT * FROM dmap WHERE user_id = %s")
+
 
 class MapMenu(discord.ui.View):
     user_settings: UserSettings
@@ -25,6 +30,7 @@ class MapMenu(discord.ui.View):
     scale: int = 1
     hit_limit: bool = False
     interaction: discord.Interaction
+    server: Server
     gyms: List[Gym]
     display_gyms: List[Gym]
     post_to: Optional[Dict[int, List[int]]] = None
@@ -38,8 +44,7 @@ class MapMenu(discord.ui.View):
         self = cls(timeout=None)
         self.interaction = interaction
 
-        query = "select * from dmap where user_id = %s"
-        result = await bot.taubsi_db.execute(query, args=interaction.user.id)
+        result = await bot.taubsi_db.execute(DMAP_SETTINGS_QUERY, args=(interaction.user.id,))
         if result:
             self.user_settings = UserSettings.from_db(result[0])
         else:
@@ -52,8 +57,8 @@ class MapMenu(discord.ui.View):
         server = [s for s in bot.servers if s.id == interaction.guild_id]
         if not server:
             raise
-        server = server[0]
-        self.gyms = server.gyms
+        self.server = server[0]
+        self.gyms = self.server.gyms
         self.embed = discord.Embed()
 
         for server in bot.servers:
@@ -189,26 +194,28 @@ class MapMenu(discord.ui.View):
             self.embed.set_footer(text=bot.translate("dmap_error"))
             return
         self.hit_limit = False
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self.url + "?pregenerate=true", json=self.get_data()) as resp:
-                pregen_id = await resp.text()
-                if "error" in pregen_id:
-                    log.warning("Tileserver threw an error. Retrying", pregen_id)
-                    resp.close()
-                    await session.close()
-                    await self.set_map(attempt + 1)
-                else:
-                    self.embed.set_image(url=self.url + "/pregenerated/" + pregen_id)
-                    footer = ""
-                    if self.hit_limit:
-                        footer = "\n" + bot.translate("dmap_marker_limit")
-                    self.embed.set_footer(text=footer)
+        try:
+            response = await http.request("POST", self.url + "?pregenerate=true", json=self.get_data())
+            pregen_id = response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            pregen_id = f"error: {e}"
+        if "error" in pregen_id:
+            log.warning(f"Tileserver threw an error. Retrying {pregen_id}")
+            await self.set_map(attempt + 1)
+        else:
+            self.embed.set_image(url=self.url + "/pregenerated/" + pregen_id)
+            footer = ""
+            if self.hit_limit:
+                footer = "\n" + bot.translate("dmap_marker_limit")
+            self.embed.set_footer(text=footer)
 
     def set_gyms(self):
         bbox = self.get_bounds()
         self.display_gyms = []
 
-        if self.user_settings.levels:
+        # no need to look at every gym if the map is showing an area outside the server's geofences
+        in_fence = any(fence.intersects_bbox(*bbox) for fence in self.server.geofences)
+        if self.user_settings.levels and in_fence:
             for gym in self.gyms:
                 if gym.raid.end > arrow.utcnow() and gym.raid.level in self.user_settings.levels and \
                         bbox[0] <= gym.lat <= bbox[1] and bbox[2] <= gym.lon <= bbox[3]:
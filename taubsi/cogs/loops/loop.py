@@ -3,7 +3,6 @@ from typing import TYPE_CHECKING
 
 from discord.ext import tasks, commands
 
-from taubsi.core import log
 from taubsi.core.uicons import IconSet
 
 if TYPE_CHECKING:
@@ -28,7 +27,8 @@ class LoopCog(commands.Cog):
             self._first_uicon = False
             return
 
-        await self.bot.pogodata.update_raids()
+        if await self.bot.pogodata.update_raids():
+            await self.bot.save_pogodata()
 
         for iconset in IconSet:
             await iconset.value.reload()
@@ -39,9 +39,7 @@ class LoopCog(commands.Cog):
             self._first_pogodata = False
             return
         await self.bot.reload_pogodata()
-        log.info("Reloaded PogoData")
 
     @tasks.loop(seconds=10)
     async def gym_loop(self):
-        for server in self.bot.servers:
-            await server.update_gyms()
+        await self.bot.gym_store.update()
@@ -5,6 +5,7 @@ import discord
 
 from taubsi.cogs.playerstats.objects import Badge, Stat
 from taubsi.core import bot
+from taubsi.core.queries import Query
 
 
 class Player:
@@ -46,6 +47,15 @@ class _LBCategory(discord.SelectOption):
 
         super().__init__(label=self.name, value=value)
 
+        # column names can't be bound, but they only ever come from the predefined Stat badges
+        self.query = Query(
+            f"leaderboard_{value}",
+            f"SELECT t.name, t.{value} FROM {bot.config.TAUBSI_DB_NAME}.users u "
+            f"LEFT JOIN {bot.config.MAD_DB_NAME}.cev_trainer t ON u.ingame_name = t.name "
+            f"WHERE ingame_name IS NOT NULL AND {value} IS NOT NULL "
+            f"ORDER BY {value} DESC"
+        )
+
     def get_current_text(self):
         return self.pages[self.selected_page].get_text()
 
@@ -54,13 +64,7 @@ class _LBCategory(discord.SelectOption):
             return
         self.prepared = True
         self.pages = []
-        query = (
-            f"select t.name, t.{self.value} from {bot.config.TAUBSI_DB_NAME}.users u "
-            f"left join {bot.config.MAD_DB_NAME}.cev_trainer t on u.ingame_name = t.name "
-            f"where ingame_name is not null and {self.value} is not null "
-            f"order by {self.value} desc"
-        )
-        players = await bot.taubsi_db.execute(query, as_dict=False)
+        players = await bot.taubsi_db.execute(self.query, as_dict=False)
 
         n = 10
         i = 1
@@ -8,6 +8,10 @@ from discord.ext import commands
 
 from taubsi.cogs.playerstats.errors import *
 from taubsi.core import bot, Team
+from taubsi.core.queries import Query
+
+IGN_BY_USER_QUERY = Query("ign_by_user", "SELECT ingame_name FROM users WHERE user_id = %s")
+USER_BY_IGN_QUERY = Query("user_by_ign", "SELECT user_id, ingame_name FROM users WHERE ingame_name = %s")
 
 
 class DataLevel(Enum):
@@ -34,8 +38,7 @@ class Player:
 
     @classmethod
     async def from_app(cls, member: discord.Member, user_id: int):
-        ign = await bot.taubsi_db.execute(f"SELECT ingame_name FROM users WHERE user_id = {member.id}",
-                                          as_dict=False)
+        ign = await bot.taubsi_db.execute(IGN_BY_USER_QUERY, args=(member.id,), as_dict=False)
         if not ign or not ign[0] or not ign[0][0]:
             if member.id == user_id:
                 raise SelfNotLinked
@@ -49,8 +52,7 @@ class Player:
     @classmethod
     async def from_command(cls, player, ctx: commands.Context):
         if isinstance(player, discord.Member):
-            ign = await bot.taubsi_db.execute(f"SELECT ingame_name FROM users WHERE user_id = {player.id}",
-                                              as_dict=False)
+            ign = await bot.taubsi_db.execute(IGN_BY_USER_QUERY, args=(player.id,), as_dict=False)
             if not ign or not ign[0] or not ign[0][0]:
                 if player.id == ctx.author.id:
                     raise SelfNotLinked
@@ -59,8 +61,7 @@ class Player:
         else:
             if any(not c.isalnum() for c in player):
                 raise PlayerNotLinked
-            result = await bot.taubsi_db.execute(f"SELECT user_id, ingame_name FROM users "
-                                                 f"WHERE ingame_name = '{player}'", as_dict=False)
+            result = await bot.taubsi_db.execute(USER_BY_IGN_QUERY, args=(player,), as_dict=False)
             if not result:
                 raise PlayerNotLinked
             user_id = result[0][0]
@@ -72,12 +73,7 @@ class Player:
         return player_
 
     async def get_stats(self):
-        fetch_stats = ",".join([s.value for s in Stat.__dict__.values() if isinstance(s, Badge)])
-        result = await bot.mad_db.execute(
-            "SELECT team, level, last_seen, {} "
-            "FROM cev_trainer "
-            "WHERE name = '{}'".format(fetch_stats, self.ign)
-        )
+        result = await bot.mad_db.execute(STATS_QUERY, args=(self.ign,))
         self.stats = result[0]
 
         self.updated = arrow.get(self.stats["last_seen"]).to("local")
@@ -200,4 +196,12 @@ class Stat:
     ICE = Badge("caught_ice", [10, 50, 200, 2500])
     DRAGON = Badge("caught_dragon", [10, 50, 200, 2500])
     DARK = Badge("caught_dark", [10, 50, 200, 2500])
-    FAIRY = Badge("caught_fairy", [10, 50, 200, 2500])
\ No newline at end of file
+    FAIRY = Badge("caught_fairy", [10, 50, 200, 2500])
+
+
+STATS_QUERY = Query(
+    "trainer_stats",
+    "SELECT team, level, last_seen, {} FROM cev_trainer WHERE name = %s".format(
+        ",".join([s.value for s in Stat.__dict__.values() if isinstance(s, Badge)])
+    )
+)
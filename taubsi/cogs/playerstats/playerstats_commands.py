@@ -9,6 +9,10 @@ from taubsi.cogs.playerstats.objects import Player
 from taubsi.cogs.playerstats.stats import StatView, DataLevel
 from taubsi.cogs.setup.errors import NameNotFound
 from taubsi.core import bot
+from taubsi.core.queries import Query
+
+TRAINER_QUERY = Query("trainer_by_name", "SELECT name, team, level FROM cev_trainer WHERE name = %s")
+UNLINK_QUERY = Query("unlink_user", "UPDATE users SET ingame_name = NULL WHERE user_id = %s")
 
 
 class PlayerstatsCommands:
@@ -25,8 +29,7 @@ class PlayerstatsCommands:
 
     @staticmethod
     async def link(name: str, user: discord.User, send: Callable, interaction: Optional[discord.Interaction] = None):
-        ingame = await bot.mad_db.execute(f"select name, team, level from cev_trainer "
-                                          f"where name = %s;", args=name, as_dict=False)
+        ingame = await bot.mad_db.execute(TRAINER_QUERY, args=(name,), as_dict=False)
         if len(ingame) == 0:
             raise NameNotFound
 
@@ -44,8 +47,7 @@ class PlayerstatsCommands:
     @staticmethod
     async def unlink(user_id: int, send: Callable):
         embed = discord.Embed(description=bot.translate("unlink"), color=3092790)
-        await bot.taubsi_db.execute(f"update users set ingame_name = NULL where user_id = %s",
-                                    args=user_id, commit=True)
+        await bot.taubsi_db.execute(UNLINK_QUERY, args=(user_id,), result=False, commit=True)
         await send(embed=embed)
 
     @staticmethod
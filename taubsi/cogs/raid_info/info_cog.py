@@ -1,19 +1,21 @@
-from typing import TYPE_CHECKING, List, Dict
+from __future__ import annotations
+from typing import TYPE_CHECKING, List, Dict, Tuple
 
 import arrow
 from discord.ext import tasks, commands
 
 from taubsi.cogs.raid_info.raidinfo import RaidInfo
 from taubsi.core import log
+from taubsi.core.events import GymEvent, GymEventType, Subscription
 
 if TYPE_CHECKING:
-    from taubsi.core import TaubsiBot, InfoChannel
+    from taubsi.core import TaubsiBot, InfoChannel, Gym
 
 
 class InfoCog(commands.Cog):
     def __init__(self, bot):
         self.bot: TaubsiBot = bot
-        self.raid_infos: Dict[str, RaidInfo] = {}
+        self.raid_infos: Dict[Tuple[int, str], RaidInfo] = {}
         self.info_channels: List[InfoChannel] = []
 
     async def final_init(self):
@@ -27,44 +29,70 @@ class InfoCog(commands.Cog):
         if self.info_channels:
             self.info_loop.start()
 
-    @tasks.loop(seconds=10)
-    async def info_loop(self):
+    async def on_gym_event(self, event: GymEvent):
+        gym = event.gym
+        if event.type == GymEventType.RAID_EXPIRED:
+            for info_channel in self.info_channels:
+                raidinfo = self.raid_infos.pop((info_channel.id, gym.id), None)
+                if raidinfo is not None:
+                    await raidinfo.delete()
+            return
+
         for info_channel in self.info_channels:
-            for gym in info_channel.gyms:
-                try:
-                    if not gym.raid:
-                        continue
-                    if not gym.raid.is_scanned:
-                        continue
-                    if gym.raid.end < arrow.utcnow():
-                        continue
-                    if gym.raid.level not in info_channel.levels:
-                        continue
+            if gym.id in info_channel.gym_ids:
+                await self._update_raidinfo(info_channel, gym)
+
+    async def _update_raidinfo(self, info_channel: InfoChannel, gym: Gym):
+        if not gym.raid:
+            return
+        if not gym.raid.is_scanned:
+            return
+        if gym.raid.end < arrow.utcnow():
+            return
+        if gym.raid.level not in info_channel.levels:
+            return
 
-                    raidinfo = self.raid_infos.get(gym.id)
+        key = (info_channel.id, gym.id)
+        raidinfo = self.raid_infos.get(key)
 
-                    if raidinfo is None:
-                        raidinfo = await RaidInfo.make(gym, info_channel)
-                        self.raid_infos[gym.id] = raidinfo
-                    else:
-                        if raidinfo.raid != gym.raid:
-                            raidinfo.raid = gym.raid.copy()
-                            await raidinfo.edit_message(embed=True)
-                except Exception as e:
-                    log.error("Exception in RaidInfo loop")
-                    log.exception(e)
+        if raidinfo is None:
+            raidinfo = await RaidInfo.make(gym, info_channel)
+            self.raid_infos[key] = raidinfo
+        else:
+            if raidinfo.raid != gym.raid:
+                raidinfo.raid = gym.raid.copy()
+                await raidinfo.edit_message(embed=True)
 
-        try:
-            for raidinfo in list(self.raid_infos.values()):
+    @tasks.loop(seconds=10)
+    async def info_loop(self):
+        """
+        Raid changes come in as events, this only refreshes the suggested times of existing raid infos.
+        Expired raid infos are deleted by the RAID_EXPIRED event
+        """
+        for key, raidinfo in list(self.raid_infos.items()):
+            # may have been deleted while an earlier one was updated
+            if key not in self.raid_infos:
+                continue
+            try:
                 await raidinfo.update_buttons()
-                if raidinfo.gym.raid.end < arrow.utcnow():
-                    await raidinfo.delete()
-                    self.raid_infos.pop(raidinfo.gym.id)
-        except Exception as e:
-            log.error("Exception in RaidInfo Loop")
-            log.exception(e)
+            except Exception as e:
+                log.error("Exception in RaidInfo Loop")
+                log.exception(e)
 
     @info_loop.before_loop
     async def info_purge(self):
         for info_channel in self.info_channels:
             await info_channel.channel.purge(limit=1000)
+
+        # subscribing first and then queueing the current raids makes sure no change is missed in between
+        # and that everything is handled in order
+        subscription: Subscription = self.bot.events.subscribe(
+            self.on_gym_event, GymEventType.raid_changes() + [GymEventType.RAID_EXPIRED]
+        )
+        active_gyms: Dict[str, Gym] = {}
+        for info_channel in self.info_channels:
+            for gym in info_channel.gyms:
+                if gym.raid and not gym.raid.has_ended:
+                    active_gyms[gym.id] = gym
+        for gym in active_gyms.values():
+            subscription.put(GymEvent(GymEventType.RAID_APPEARED, gym))
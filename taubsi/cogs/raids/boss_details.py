@@ -143,6 +143,8 @@ class BossDetailsButton(discord.ui.Button):
         embed.set_footer(text=bot.translate("no_megas_cryptos"))
 
         attackers = pokebattler.best_attackers
-        counters = await BossDetailsImage.get_counter_image(attackers)
+        counters = await BossDetailsImage.get_counter_image(
+            attackers, self.raidmessage.raid.pokebattler_name, self.raidmessage.raid.level, pokebattler.time
+        )
         embed.set_image(url=counters)
         await interaction.edit_original_message(embed=embed, view=BossDetailsView(self.raidmessage))
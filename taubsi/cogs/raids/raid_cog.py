@@ -1,21 +1,33 @@
 import asyncio
 import re
-from typing import Dict, List, TYPE_CHECKING, Tuple, Optional
+from typing import Dict, TYPE_CHECKING, Tuple, Optional
 
 import arrow
 import dateparser
 from dateutil import tz
-from discord.ext import tasks, commands
+from discord.ext import commands
 
 from taubsi.cogs.raids.choicemessage import ChoiceMessage
 from taubsi.cogs.raids.raidmessage import RaidMessage
 from taubsi.cogs.raids.errors import TaubsiError, InvalidTime
 from taubsi.core import log
+from taubsi.core.events import GymEvent, GymEventType
+from taubsi.core.queries import Query
 from taubsi.utils.errors import command_error
 
 if TYPE_CHECKING:
     from taubsi.core import TaubsiBot
 
+OPEN_RAIDS_QUERY = Query(
+    "open_raids",
+    """
+    SELECT channel_id, message_id, init_message_id, start_time, gym_id, role_id
+    FROM raids
+    WHERE start_time > utc_timestamp()
+    """
+)
+DELETE_RAID_QUERY = Query("delete_raid", "DELETE FROM raids WHERE message_id = %s")
+
 
 def match_time(content: str, is_event: bool = False) -> Tuple[Optional[arrow.Arrow], str]:
     possible_times = []
@@ -55,20 +67,26 @@ class RaidCog(commands.Cog):
 
     async def final_init(self):
         try:
-            rm_query = """
-            SELECT channel_id, message_id, init_message_id, start_time, gym_id, role_id
-            FROM raids
-            WHERE start_time > utc_timestamp()
-            """
-            raidmessages_db = await self.bot.taubsi_db.execute(rm_query, as_dict=False)
-            for entry in raidmessages_db:
-                raidmessage = await RaidMessage.from_db(*entry)
-                self.raidmessages[raidmessage.message.id] = raidmessage
+            raidmessages_db = await self.bot.taubsi_db.execute(OPEN_RAIDS_QUERY, as_dict=False)
+            members = await RaidMessage.load_members([entry[1] for entry in raidmessages_db])
+            semaphore = asyncio.Semaphore(self.bot.config.RAID_RESTORE_CONCURRENCY)
+
+            async def restore(entry):
+                async with semaphore:
+                    try:
+                        raidmessage = await RaidMessage.from_db(*entry, member_entries=members.get(entry[1]))
+                        self._add_raidmessage(raidmessage)
+                    except Exception as e:
+                        log.error(f"Couldn't restore raid {entry[1]}. It may not be responsive anymore")
+                        log.exception(e)
+
+            await asyncio.gather(*[restore(entry) for entry in raidmessages_db])
+            log.info(f"Restored {len(self.raidmessages)} raids")
         except Exception as e:
             log.error("Error while querying ongoing raids. Existing raids may not be responsive anymore")
             log.exception(e)
 
-        self.raid_loop.start()
+        self.bot.events.subscribe(self.on_raid_change, GymEventType.raid_changes())
 
     async def cog_command_error(self, ctx, error):
         if not isinstance(error, TaubsiError):
@@ -76,13 +94,44 @@ class RaidCog(commands.Cog):
             return
         await command_error(ctx.send, error.__doc__, False)
 
+    def _add_raidmessage(self, raidmessage: RaidMessage):
+        """
+        Tracks the raid message and schedules its 5 minute notification and its end
+        """
+        self.raidmessages[raidmessage.message.id] = raidmessage
+
+        now = arrow.now()
+        warn_at = raidmessage.start_time.shift(minutes=-5)
+        # same 1 minute grace window the notification always had
+        if warn_at.shift(minutes=1) > now:
+            raidmessage.jobs.append(self.bot.scheduler.schedule(
+                max(warn_at, now), lambda: self._notify_start(raidmessage), name=f"notify {raidmessage.message.id}"
+            ))
+        raidmessage.jobs.append(self.bot.scheduler.schedule(
+            raidmessage.start_time.shift(minutes=6), lambda: self._end_raid(raidmessage),
+            name=f"end {raidmessage.message.id}"
+        ))
+
+    def _remove_raidmessage(self, raidmessage: RaidMessage):
+        for job in raidmessage.jobs:
+            job.cancel()
+        raidmessage.cancel_edit()
+        self.raidmessages.pop(raidmessage.message.id, None)
+
+    async def _notify_start(self, raidmessage: RaidMessage):
+        await raidmessage.notify(self.bot.translate("notify_raid_starts"))
+
+    async def _end_raid(self, raidmessage: RaidMessage):
+        self._remove_raidmessage(raidmessage)
+        await raidmessage.end_raid()
+
     async def create_raid(self, raidmessage: RaidMessage):
         for other_message in self.raidmessages.values():
             if other_message.gym.id == raidmessage.gym.id:
                 warning = self.bot.translate("warn_other_times").format(other_message.formatted_start)
                 raidmessage.static_warnings.add(warning)
                 raidmessage.make_warnings()
-        self.raidmessages[raidmessage.message.id] = raidmessage
+        self._add_raidmessage(raidmessage)
         self.bot.loop.create_task(raidmessage.set_image())
         self.bot.loop.create_task(raidmessage.set_pokebattler())
 
@@ -148,7 +197,7 @@ class RaidCog(commands.Cog):
             return
         raidmessage = self.raidmessages.get(payload.message_id)
         if raidmessage is not None:
-            await raidmessage.add_reaction(payload)
+            raidmessage.queue_reaction(payload, added=True)
 
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload):
@@ -157,7 +206,7 @@ class RaidCog(commands.Cog):
         raidmessage = self.raidmessages.get(payload.message_id)
         if not raidmessage:
             return
-        await raidmessage.remove_reaction(payload)
+        raidmessage.queue_reaction(payload, added=False)
 
     @commands.Cog.listener()
     async def on_message_delete(self, message):
@@ -170,45 +219,38 @@ class RaidCog(commands.Cog):
             await raidmessage.init_message.delete()
         except Exception:
             pass
-        await raidmessage.role.delete()
-        self.raidmessages.pop(message.id)
-        await self.bot.taubsi_db.execute(
-            f"delete from raids where message_id = {message.id}", result=False, commit=True)
-
-    @tasks.loop(seconds=10)
-    async def raid_loop(self):
-        raidmessages: List[RaidMessage] = list(self.raidmessages.copy().values())
+        self.bot.role_sync.delete_role(raidmessage.role)
+        self._remove_raidmessage(raidmessage)
+        await self.bot.taubsi_db.write_buffer.discard("raids", (message.id,))
+        await self.bot.taubsi_db.execute(DELETE_RAID_QUERY, args=(message.id,), result=False, commit=True)
+
+    async def on_raid_change(self, event: GymEvent):
+        """
+        Only raid messages at the gym that changed are looked at
+        """
+        raidmessages = [r for r in self.raidmessages.values() if r.gym.id == event.gym.id]
         for raidmessage in raidmessages:
             try:
-                message = raidmessage.message
-
-                if arrow.now() > raidmessage.start_time.shift(minutes=6):
-                    await raidmessage.end_raid()
-                    self.raidmessages.pop(message.id)
-                if raidmessage.start_time.shift(minutes=-5) < arrow.now() < raidmessage.start_time.shift(minutes=-4):
-                    if not raidmessage.notified_5_minutes:
-                        await raidmessage.notify(self.bot.translate("notify_raid_starts"))
-                        raidmessage.notified_5_minutes = True
-
-                if not raidmessage.raid.is_scanned or not raidmessage.raid.moveset:
-                    if raidmessage.raid_channel.is_event:
-                        continue
-                    if raidmessage.gym.raid is None:
-                        continue
-                    if raidmessage.gym.raid.end < arrow.utcnow():
-                        continue
-                    if raidmessage.raid == raidmessage.gym.raid:
-                        continue
-                    log.info(f"Raid Boss at {raidmessage.message.id} changed. Updating")
-                    if not raidmessage.raid.boss and raidmessage.gym.raid.boss:
-                        await raidmessage.notify(self.bot.translate("notify_hatched").format(
-                            raidmessage.gym.raid.boss.name))
-
-                    raidmessage.raid = raidmessage.gym.raid.copy()
-                    await raidmessage.make_base_embed()
-                    await raidmessage.set_pokebattler()
-                    await raidmessage.set_image()
-                    await raidmessage.db_insert()
+                if raidmessage.raid.is_scanned and raidmessage.raid.moveset:
+                    continue
+                if raidmessage.raid_channel.is_event:
+                    continue
+                if raidmessage.gym.raid is None:
+                    continue
+                if raidmessage.gym.raid.end < arrow.utcnow():
+                    continue
+                if raidmessage.raid == raidmessage.gym.raid:
+                    continue
+                log.info(f"Raid Boss at {raidmessage.message.id} changed. Updating")
+                if not raidmessage.raid.boss and raidmessage.gym.raid.boss:
+                    await raidmessage.notify(self.bot.translate("notify_hatched").format(
+                        raidmessage.gym.raid.boss.name))
+
+                raidmessage.raid = raidmessage.gym.raid.copy()
+                await raidmessage.make_base_embed()
+                await raidmessage.set_pokebattler()
+                await raidmessage.set_image()
+                await raidmessage.db_insert()
             except Exception as e:
-                log.error("Error while Raid looping")
+                log.error("Error while updating a changed raid")
                 log.exception(e)
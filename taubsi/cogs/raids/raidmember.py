@@ -3,9 +3,9 @@ from taubsi.core import log, bot
 
 
 class RaidMember:
-    is_late: bool
-    is_remote: bool
-    amount: int
+    is_late: bool = False
+    is_remote: bool = False
+    amount: int = 0
 
     def __init__(self, raidmessage, user_id, amount):
         self.raidmessage = raidmessage
@@ -27,19 +27,18 @@ class RaidMember:
         self.update(amount)
 
     def update(self, amount=None):
+        self.raidmessage.count_member(self, -1)
+
         self.is_late = self.member.id in self.raidmessage.lates
         self.is_remote = self.member.id in self.raidmessage.remotes
 
         if amount is not None:
             self.amount = amount
 
-    async def make_role(self):
-        if self.amount > 0:
-            if self.raidmessage.role not in self.member.roles:
-                await self.member.add_roles(self.raidmessage.role)
-        else:
-            if self.raidmessage.role in self.member.roles:
-                await self.member.remove_roles(self.raidmessage.role)
+        self.raidmessage.count_member(self)
+
+    def sync_role(self):
+        bot.role_sync.set(self.member, self.raidmessage.role, self.amount > 0)
 
     def make_text(self):
         text = self.member.display_name + f" ({self.amount})"
@@ -57,4 +56,4 @@ class RaidMember:
             "is_late": self.is_late,
             "is_remote": self.is_remote
         }
-        await bot.taubsi_db.insert("raidmembers", keyvals)
+        bot.taubsi_db.insert_buffered("raidmembers", keyvals, primary_key=("message_id", "user_id"))
@@ -1,7 +1,9 @@
 from __future__ import annotations
+import asyncio
 import json
+import time
 from math import floor, ceil
-from typing import List, Set, Optional, TYPE_CHECKING, NoReturn, Union
+from typing import List, Set, Dict, Tuple, Optional, TYPE_CHECKING, NoReturn, Union
 
 import discord
 import arrow
@@ -11,6 +13,7 @@ from taubsi.utils.errors import command_error
 from taubsi.cogs.raids.errors import PokebattlerNotLoaded
 from taubsi.cogs.raids.raidmember import RaidMember
 from taubsi.core import bot, Gym, Raid, Team, log
+from taubsi.core.queries import Query
 from taubsi.pokebattler.models import Difficulty
 from taubsi.utils.image_manipulation import BossDetailsImage, get_raid_image
 from taubsi.cogs.raids.boss_details import BossDetailsButton
@@ -19,6 +22,7 @@ if TYPE_CHECKING:
     from datetime import datetime
     from taubsi.core import RaidChannel
     from taubsi.pokebattler.models import RaidPayload
+    from taubsi.core.scheduler import ScheduledJob
 
 timeformat = bot.translate("timeformat_short")
 
@@ -28,6 +32,11 @@ REMOTE_LIMIT = 10
 GMAPS_LINK = "https://www.google.com/maps/search/?api=1&query={},{}"
 AMAPS_LINK = "https://maps.apple.com/maps?daddr={},{}"
 
+RAIDMEMBERS_QUERY = Query(
+    "raidmembers_by_messages",
+    "SELECT message_id, user_id, amount, is_late, is_remote FROM raidmembers WHERE message_id IN %s"
+)
+
 
 """
 class RaidmessageView(discord.ui.View):
@@ -134,9 +143,10 @@ class RaidMessage:
 
     raid_channel: RaidChannel
     channel_id: int
-    message: discord.Message
-    init_message: Optional[discord.Message]
+    message: Union[discord.Message, discord.PartialMessage]
+    init_message: Optional[Union[discord.Message, discord.PartialMessage]]
     author_id: Optional[int]
+    _hydrated: bool = True
 
     role: discord.Role
     view: RaidmessageView
@@ -144,14 +154,22 @@ class RaidMessage:
     warnings: Set[str]
     static_warnings: Set[str]
 
-    members: List[RaidMember]
-    remotes: List[int]
-    lates: List[int]
+    members: Dict[int, RaidMember]
+    remotes: Set[int]
+    lates: Set[int]
+    total_amount: int
+    remote_amount: int
+    team_amounts: Dict[Team, int]
 
     pokebattler: Optional[RaidPayload]
     difficulty: Difficulty
 
-    notified_5_minutes: bool = False
+    jobs: List[ScheduledJob]
+    _edit_task: Optional[asyncio.Task] = None
+    _last_edit: float = 0
+    _pending_reactions: List[Tuple[discord.RawReactionActionEvent, bool]]
+    _reaction_task: Optional[asyncio.Task] = None
+    _deleted: bool = False
 
     def __init__(self, gym: Gym, start: arrow.Arrow, channel_id: int):
         self.embed = discord.Embed()
@@ -164,9 +182,15 @@ class RaidMessage:
 
         self.raid = gym.get_raid(self.raid_channel.level)
 
-        self.members = []
-        self.remotes = []
-        self.lates = []
+        self.members = {}
+        self.jobs = []
+        self._pending_reactions = []
+        self._hydrate_lock = asyncio.Lock()
+        self.remotes = set()
+        self.lates = set()
+        self.total_amount = 0
+        self.remote_amount = 0
+        self.team_amounts = {team: 0 for team in Team}
         self.warnings = set()
         self.static_warnings = set()
         self.difficulty = Difficulty.IMPOSSIBLE
@@ -206,13 +230,30 @@ class RaidMessage:
         await self.send_message()
         return self
 
+    @staticmethod
+    async def load_members(message_ids: List[int]) -> Dict[int, List[dict]]:
+        """
+        Raid members of all given messages in one query, by message id
+        """
+        if not message_ids:
+            # "IN ()" isn't valid SQL
+            return {}
+        result = {}
+        raidmember_db = await bot.taubsi_db.execute(RAIDMEMBERS_QUERY, args=(tuple(message_ids),))
+        for entry in raidmember_db:
+            result.setdefault(entry["message_id"], []).append(entry)
+        return result
+
     @classmethod
     async def from_db(cls, channel_id: int, message_id: int, init_message_id: int, start_time: datetime,
-                      gym_id: int, role_id: int) -> RaidMessage:
+                      gym_id: int, role_id: int, member_entries: Optional[List[dict]] = None) -> RaidMessage:
+        """
+        Restores a raid without fetching its messages. They're only fetched once the raid gets edited
+        or its author wants to delete it, see hydrate()
+        """
         start = arrow.get(start_time).to("local")
-        channel: discord.TextChannel = await bot.fetch_channel(channel_id)
-        message = await channel.fetch_message(message_id)
-        server = [s for s in bot.servers if message.guild.id == s.id]
+        channel: discord.TextChannel = bot.get_channel(channel_id) or await bot.fetch_channel(channel_id)
+        server = [s for s in bot.servers if channel.guild.id == s.id]
         if not server:
             raise
         server = server[0]
@@ -223,56 +264,124 @@ class RaidMessage:
 
         self = cls(gym, start, channel_id)
 
-        self.message = message
-        self.role = self.message.guild.get_role(role_id)
+        self.message = channel.get_partial_message(message_id)
+        self.role = channel.guild.get_role(role_id)
+        self.init_message = channel.get_partial_message(init_message_id) if init_message_id else None
+        self.author_id = None
+        self._hydrated = False
 
         await self.set_pokebattler()
         self.set_difficulty()
 
-        try:
-            self.init_message = await channel.fetch_message(init_message_id)
-            self.author_id = self.init_message.author.id
-        except discord.NotFound:
-            self.init_message = None
-            self.author_id = None
-
-        raidmember_db = await bot.taubsi_db.execute(
-            f"select user_id, amount, is_late, is_remote from raidmembers where message_id = {self.message.id}")
-        for entry in raidmember_db:
+        for entry in member_entries or []:
             if entry["is_late"]:
-                self.lates.append(entry["user_id"])
+                self.lates.add(entry["user_id"])
             if entry["is_remote"]:
-                self.remotes.append(entry["user_id"])
+                self.remotes.add(entry["user_id"])
             raidmember = RaidMember(self, entry["user_id"], entry["amount"])
-            self.members.append(raidmember)
+            self.members[entry["user_id"]] = raidmember
 
-        self.embed = self.message.embeds[0]
         self.set_view()
-        await self.make_member_fields()
-        await self.make_base_embed()
-        self.make_warnings()
-        await self.edit_message()
-
+        bot.add_view(self.view, message_id=message_id)
         return self
 
+    async def hydrate(self) -> NoReturn:
+        """
+        Fetches the messages of a restored raid and brings its embed up to date
+        """
+        async with self._hydrate_lock:
+            if self._hydrated:
+                return
+            log.info(f"Hydrating restored raid {self.message.id}")
+
+            self.message = await self.message.fetch()
+            if self.init_message is not None:
+                try:
+                    self.init_message = await self.init_message.fetch()
+                    self.author_id = self.init_message.author.id
+                except discord.NotFound:
+                    self.init_message = None
+            self._hydrated = True
+
+            if self.message.embeds:
+                old_embed = self.message.embeds[0]
+                # the only parts of the embed that can't be built again
+                if old_embed.thumbnail.url and not self.embed.thumbnail.url:
+                    self.embed.set_thumbnail(url=old_embed.thumbnail.url)
+                footer = old_embed.footer.text or ""
+                if "\n" in footer:
+                    self.footer_prefix = footer.rsplit("\n", 1)[0] + "\n"
+
+            await self.make_base_embed()
+            await self.make_member_fields()
+
     def set_view(self):
         self.view = RaidmessageView(self)
 
-    @property
-    def total_amount(self) -> int:
-        return sum([m.amount for m in self.members])
-
     @property
     def formatted_start(self) -> str:
         return self.start_time.strftime(timeformat)
 
     def get_member(self, user_id: int) -> Optional[RaidMember]:
-        for member in self.members:
-            if member.member.id == user_id:
-                return member
-        return None
+        return self.members.get(user_id)
+
+    def count_member(self, member: RaidMember, sign: int = 1) -> NoReturn:
+        """
+        Adds (sign=1) or removes (sign=-1) a member's amount from the running totals
+        """
+        amount = sign * member.amount
+        self.total_amount += amount
+        if member.is_remote:
+            self.remote_amount += amount
+        if member.team is not None:
+            self.team_amounts[member.team] += amount
+
+    def queue_reaction(self, payload: discord.RawReactionActionEvent, added: bool) -> NoReturn:
+        """
+        Reactions are applied one batch at a time. Everything that comes in while a batch is processed
+        ends up in the next one, so a burst of reactions only causes one render and one write per member
+        """
+        self._pending_reactions.append((payload, added))
+        if self._reaction_task is None:
+            self._reaction_task = bot.loop.create_task(self._process_reactions())
+
+    async def _process_reactions(self) -> NoReturn:
+        try:
+            while self._pending_reactions and not self._deleted:
+                batch = self._pending_reactions
+                self._pending_reactions = []
+                try:
+                    await self._apply_reactions(batch)
+                except Exception as e:
+                    log.error(f"Exception while processing reactions on {self.message.id}")
+                    log.exception(e)
+        finally:
+            self._reaction_task = None
+
+    async def _apply_reactions(self, batch: List[Tuple[discord.RawReactionActionEvent, bool]]) -> NoReturn:
+        changed: Dict[int, RaidMember] = {}
+        for payload, added in batch:
+            if added:
+                member = await self.add_reaction(payload)
+            else:
+                member = await self.remove_reaction(payload)
+            if self._deleted:
+                return
+            if member is not None:
+                changed[member.member.id] = member
+
+        if not changed:
+            return
 
-    async def add_reaction(self, payload: discord.RawReactionActionEvent) -> NoReturn:
+        await self.make_member_fields()
+        for member in changed.values():
+            member.sync_role()
+            await member.db_insert()
+
+    async def add_reaction(self, payload: discord.RawReactionActionEvent) -> Optional[RaidMember]:
+        """
+        Applies an added reaction to the member state and returns the changed member
+        """
         emote = str(payload.emoji)
         member = self.get_member(payload.user_id)
         amount = None
@@ -280,21 +389,23 @@ class RaidMessage:
         notification = ""
         if not member:
             member = RaidMember(self, payload.user_id, 1)
-            self.members.append(member)
+            self.members[payload.user_id] = member
 
         if emote in bot.config.CONTROL_EMOJIS.values():
             control = reverse_get(bot.config.CONTROL_EMOJIS, emote)
 
             if control == "remove":
+                await self.hydrate()
                 if payload.user_id == self.author_id:
+                    self._deleted = True
                     await self.message.delete()
-                    return
+                    return None
             elif control == "late":
-                self.lates.append(payload.user_id)
+                self.lates.add(payload.user_id)
                 notification = f"🕐 {member.member.display_name}"
                 to_notify = True
             elif control == "remote":
-                self.remotes.append(payload.user_id)
+                self.remotes.add(payload.user_id)
 
         elif emote in bot.config.NUMBER_EMOJIS.values():
             amount = reverse_get(bot.config.NUMBER_EMOJIS, emote)
@@ -302,19 +413,20 @@ class RaidMessage:
             to_notify = True
 
         else:
-            return
+            return None
 
         member.update(amount)
-        await self.make_member_fields()
         if to_notify:
             await self.notify(notification, member.member)
-        await member.make_role()
-        await member.db_insert()
+        return member
 
-    async def remove_reaction(self, payload: discord.RawReactionActionEvent) -> NoReturn:
+    async def remove_reaction(self, payload: discord.RawReactionActionEvent) -> Optional[RaidMember]:
+        """
+        Applies a removed reaction to the member state and returns the changed member
+        """
         member = self.get_member(payload.user_id)
         if not member:
-            return
+            return None
 
         # code duplication :thumbsdown:
         amount = None
@@ -323,12 +435,12 @@ class RaidMessage:
             control = reverse_get(bot.config.CONTROL_EMOJIS, emote)
 
             if control == "late":
-                self.lates.remove(payload.user_id)
+                self.lates.discard(payload.user_id)
                 if member.amount > 0:
                     await self.notify(bot.translate("notify_on_time").format(
                         member.member.display_name), member.member)
             elif control == "remote":
-                self.remotes.remove(payload.user_id)
+                self.remotes.discard(payload.user_id)
 
         elif emote in bot.config.NUMBER_EMOJIS.values():
             if member.amount > 0:
@@ -336,26 +448,28 @@ class RaidMessage:
                 amount = 0
 
         member.update(amount)
-        await self.make_member_fields()
-        await member.make_role()
-        await member.db_insert()
+        return member
 
     async def notify(self, message: str, user: Optional[discord.User] = None) -> NoReturn:
         log.info(f"Raid notification: {message}")
-        for member in self.members:
+        recipients = []
+        for member in self.members.values():
             if not member.is_subscriber:
                 continue
             if member.amount == 0:
                 continue
             if user is not None and user.id == member.member.id:
                 continue
+            recipients.append(member.member)
 
-            embed = discord.Embed()
-            embed.title = self.gym.name
-            embed.url = self.message.jump_url
-            embed.description = message
+        if not recipients:
+            return
 
-            await member.member.send(embed=embed)
+        embed = discord.Embed()
+        embed.title = self.gym.name
+        embed.url = self.message.jump_url
+        embed.description = message
+        bot.notifier.send(embed, recipients)
 
     def set_difficulty(self):
         if self.raid.boss and self.pokebattler:
@@ -413,32 +527,23 @@ class RaidMessage:
 
     async def make_member_fields(self) -> NoReturn:
         self.embed.clear_fields()
+
+        team_texts: Dict[Team, str] = {}
+        for member in self.members.values():
+            if member.team is not None and member.amount > 0:
+                team_texts[member.team] = team_texts.get(member.team, "") + member.make_text()
+
         for team in Team:
             if team.value == 0:
                 continue
-            emoji = bot.config.TEAM_EMOJIS[team.value]
-
-            index = 0
-            for field in self.embed.fields:
-                if emoji in field.name:
-                    break
-                index += 1
-
-            members = [m for m in self.members if m.team == team]
-            team_amount = sum([m.amount for m in members])
-
+            team_amount = self.team_amounts[team]
             if team_amount > 0:
-                field_name = f"{emoji} ({team_amount})"
-                field_value = ""
-                for member in members:
-                    if member.amount > 0:
-                        field_value += member.make_text()
-                self.embed.insert_field_at(index=index, name=field_name, value=field_value, inline=False)
+                emoji = bot.config.TEAM_EMOJIS[team.value]
+                self.embed.add_field(name=f"{emoji} ({team_amount})", value=team_texts[team], inline=False)
 
         self.warnings.clear()
 
-        total_remote = sum(m.amount for m in self.members if m.is_remote)
-        remote_cap = (total_remote > REMOTE_LIMIT - 2)
+        remote_cap = (self.remote_amount > REMOTE_LIMIT - 2)
         total_cap = (self.total_amount > TOTAL_LIMIT - 2)
         if remote_cap and total_cap:
             self.warnings.add(bot.translate("warn_too_many_both").format(TOTAL_LIMIT, REMOTE_LIMIT))
@@ -447,7 +552,7 @@ class RaidMessage:
         elif total_cap:
             self.warnings.add(bot.translate("warn_too_many_total").format(TOTAL_LIMIT))
 
-        if [m for m in self.members if m.is_late]:
+        if self.lates:
             self.warnings.add(bot.translate("warn_is_late"))
 
         self.make_warnings()
@@ -472,11 +577,43 @@ class RaidMessage:
             keyvals["raid_start"] = self.raid.start.naive
             keyvals["raid_end"] = self.raid.end.naive
 
-        await bot.taubsi_db.insert("raids", keyvals)
+        bot.taubsi_db.insert_buffered("raids", keyvals, primary_key=("message_id",))
 
     async def edit_message(self) -> NoReturn:
+        """
+        Marks the message as changed. Edits are sent at most once per RAID_EDIT_INTERVAL seconds
+        and always contain the latest state of the embed
+        """
+        if self._edit_task is None:
+            self._edit_task = bot.loop.create_task(self._delayed_edit())
+
+    def cancel_edit(self) -> NoReturn:
+        if self._edit_task is not None:
+            self._edit_task.cancel()
+            self._edit_task = None
+
+    async def _delayed_edit(self) -> NoReturn:
+        try:
+            await self.hydrate()
+        except discord.HTTPException as e:
+            self._edit_task = None
+            log.error(f"Couldn't fetch restored raid {self.message.id}")
+            log.exception(e)
+            return
+
+        delay = self._last_edit + bot.config.RAID_EDIT_INTERVAL - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        # changes from now on need another edit
+        self._edit_task = None
+        self._last_edit = time.monotonic()
         log.info(f"Editing message {self.message.id}")
-        await self.message.edit(embed=self.embed, view=self.view)
+        try:
+            await self.message.edit(embed=self.embed, view=self.view)
+        except discord.HTTPException as e:
+            log.error(f"Couldn't edit message {self.message.id}")
+            log.exception(e)
 
     async def send_message(self, interaction: discord.Interaction = None) -> NoReturn:
         channel = await bot.fetch_channel(self.channel_id)
@@ -493,6 +630,9 @@ class RaidMessage:
     async def end_raid(self) -> NoReturn:
         log.info(f"Raid {self.message.id} started. Clearing reactions and deleting its role.")
 
+        # hydrating schedules an edit with the buttons, which is cancelled right after
+        await self.hydrate()
+        self.cancel_edit()
         await self.message.edit(embed=self.embed, view=None)
         await self.message.clear_reactions()
-        await self.role.delete()
+        bot.role_sync.delete_role(self.role)
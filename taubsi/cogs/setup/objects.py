@@ -4,6 +4,9 @@ from typing import Optional
 import discord
 
 from taubsi.core import log, Team, bot
+from taubsi.core.queries import Query
+
+USER_QUERY = Query("user_settings", "SELECT level, IFNULL(team_id, 0), friendcode, name FROM users WHERE user_id = %s")
 
 
 def name_level_from_nick(nick):
@@ -34,9 +37,7 @@ class TaubsiUser:
     
     async def from_member(self, member):
         self.friendcode = None
-        result = await bot.taubsi_db.execute(
-            f"select level, ifnull(team_id, 0), friendcode, name from users where user_id = %s;",
-            args=member.id, as_dict=False)
+        result = await bot.taubsi_db.execute(USER_QUERY, args=(member.id,), as_dict=False)
         self.user_id = member.id
         if not result:
             nick = member.display_name
@@ -1,5 +1,6 @@
 from __future__ import annotations
-from typing import List, Dict, TYPE_CHECKING
+import os
+from typing import List, Dict, Optional, TYPE_CHECKING
 
 import discord
 from discord.ext import commands
@@ -7,12 +8,19 @@ from taubsi.pogodata import PogoData
 
 from config import Config
 from taubsi.core.queries import Queries
+from taubsi.core.gym_store import GymStore
+from taubsi.core.events import EventBus
+from taubsi.core.scheduler import Scheduler
+from taubsi.core.notifications import NotificationDispatcher
+from taubsi.core.role_sync import RoleSync
+from taubsi.core.image_server import ImageServer
 from taubsi.core.uicons import UIconManager
 from taubsi.core.translator import Translator
 from taubsi.core.config_classes import Server, RaidChannel
 from taubsi.core.logging import log
 from taubsi.core.cogs import Cog
 from taubsi.core.emojis import EmojiManager
+from taubsi.utils import http, image_executor
 
 if TYPE_CHECKING:
     from taubsi.pokebattler import PokeBattler
@@ -20,9 +28,16 @@ if TYPE_CHECKING:
 
 class TaubsiBot(commands.Bot):
     _startup: bool = True
+    _pogodata_from_snapshot: bool = False
     config: Config
     mad_db: Queries
     taubsi_db: Queries
+    gym_store: GymStore
+    events: EventBus
+    scheduler: Scheduler
+    notifier: NotificationDispatcher
+    role_sync: RoleSync
+    image_server: Optional[ImageServer] = None
     uicons: UIconManager
     emoji_manager: EmojiManager
     translate: Translator.translate
@@ -40,9 +55,22 @@ class TaubsiBot(commands.Bot):
         super().__init__(command_prefix="!", case_insensitive=True, intents=intents,
                          update_application_commands_at_startup=True)
         self.config = Config()
+        http.configure(self.config.HTTP_LIMIT_PER_HOST, self.config.HTTP_TIMEOUT, self.config.HTTP_RETRIES,
+                       self.config.HTTP_MAX_SIZE)
+        image_executor.configure(self.config.IMAGE_EXECUTOR, self.config.IMAGE_WORKERS)
         self.mad_db = Queries(self.config, self.loop, self.config.MAD_DB_NAME)
         self.taubsi_db = Queries(self.config, self.loop, self.config.TAUBSI_DB_NAME)
         self.uicons = UIconManager()
+        self.events = EventBus(self.loop)
+        self.scheduler = Scheduler(self.loop)
+        self.notifier = NotificationDispatcher(self.loop, self.config.NOTIFY_WORKERS, self.config.NOTIFY_MAX_RETRIES)
+        self.role_sync = RoleSync(self.loop, self.config.ROLE_SYNC_INTERVAL, self.config.ROLE_SYNC_BATCH_SIZE)
+        self.gym_store = GymStore(self)
+        if self.config.IMAGE_SERVER_URL:
+            self.image_server = ImageServer(
+                self.loop, os.path.join(self.config.IMAGE_CACHE_DIR, "served"), self.config.IMAGE_SERVER_HOST,
+                self.config.IMAGE_SERVER_PORT, self.config.IMAGE_SERVER_URL, self.config.IMAGE_SERVER_KEEP_DAYS
+            )
         self.servers = self.config.SERVERS
 
         self.server_ids = []
@@ -56,10 +84,47 @@ class TaubsiBot(commands.Bot):
 
         translator_ = Translator(self.config.LANGUAGE.value)
         self.translate = translator_.translate
-        self.pogodata = PogoData.make_sync(self.config.LANGUAGE.value)
+        self.pogodata = PogoData.from_snapshot(self.config.LANGUAGE.value)
+        self._pogodata_from_snapshot = self.pogodata is not None
+        if self._pogodata_from_snapshot:
+            log.info("Loaded PogoData from snapshot, refreshing it once logged in")
+        else:
+            self.pogodata = PogoData.make_sync(self.config.LANGUAGE.value)
+            self._save_pogodata(self.pogodata)
+
+    @staticmethod
+    def _save_pogodata(pogodata: PogoData):
+        try:
+            pogodata.save_snapshot()
+        except Exception as e:
+            log.error("Couldn't save a PogoData snapshot")
+            log.exception(e)
+
+    async def save_pogodata(self):
+        await self.loop.run_in_executor(None, self._save_pogodata, self.pogodata)
 
     async def reload_pogodata(self):
-        self.pogodata = await PogoData.make_async(self.config.LANGUAGE.value)
+        try:
+            pogodata = await PogoData.make_async(self.config.LANGUAGE.value)
+        except Exception as e:
+            log.error("Couldn't reload PogoData, keeping the old one")
+            log.exception(e)
+            return
+        if pogodata is None:
+            log.info("PogoData sources didn't change")
+            # raids change a lot more often, e.g. the snapshot's may be outdated
+            try:
+                if await self.pogodata.update_raids():
+                    log.info("Updated raids")
+                    await self.save_pogodata()
+            except Exception as e:
+                log.error("Couldn't update raids")
+                log.exception(e)
+            return
+        # only swapped in once it's complete, so nothing ever sees a half built PogoData
+        self.pogodata = pogodata
+        log.info("Reloaded PogoData")
+        await self.save_pogodata()
 
     async def on_ready(self):
         if not self._startup:
@@ -67,6 +132,15 @@ class TaubsiBot(commands.Bot):
         self._startup = False
         log.info("Logged in, setting up everything")
 
+        await self.mad_db.connect()
+        await self.taubsi_db.connect()
+
+        if self.image_server is not None:
+            await self.image_server.start()
+
+        if self._pogodata_from_snapshot:
+            self.loop.create_task(self.reload_pogodata())
+
         self.trash_channel = await self.fetch_channel(self.config.TRASH_CHANNEL_ID)
 
         trash_guild = await self.fetch_guild(self.config.TRASH_GUILD_ID)
@@ -80,6 +154,7 @@ class TaubsiBot(commands.Bot):
             await server.load(self)
             for info_channel in server.info_channels:
                 info_channel.channel = await self.fetch_channel(info_channel.id)
+        await self.gym_store.update()
 
         log.info("Preparing cogs")
         for cog_enum in [Cog.RAIDS, Cog.RAIDINFO, Cog.MAIN_LOOPS, Cog.AUTOSETUP]:
@@ -96,5 +171,15 @@ class TaubsiBot(commands.Bot):
 
         log.info("Fully loaded, ready for action")
 
+    async def close(self):
+        await super().close()
+        self.notifier.close()
+        await self.mad_db.close()
+        await self.taubsi_db.close()
+        await http.close()
+        if self.image_server is not None:
+            await self.image_server.close()
+        image_executor.shutdown()
+
 
 bot = TaubsiBot()
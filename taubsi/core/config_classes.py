@@ -1,19 +1,33 @@
 from __future__ import annotations
-from typing import List, Dict, Optional, TYPE_CHECKING, Tuple
-import json
+from typing import List, Dict, Optional, TYPE_CHECKING, Tuple, Union, Set
 from enum import Enum
 
+import arrow
 import discord
 from thefuzz import process, fuzz, utils
 
 from taubsi.core.logging import log
+from taubsi.core.geofence import Geofence, load_geofences
 from taubsi.core.pogo import Gym
 from taubsi.core.cogs import Cog
+from taubsi.core.queries import Query
 
 if TYPE_CHECKING:
     from taubsi.core.bot import TaubsiBot
 
 
+GYMS_QUERY = Query(
+    "gyms_in_bbox",
+    """
+    SELECT name, gym.gym_id AS id, url, latitude, longitude
+    FROM gymdetails
+    LEFT JOIN gym ON gym.gym_id = gymdetails.gym_id
+    WHERE latitude BETWEEN %s AND %s AND longitude BETWEEN %s AND %s
+    ORDER BY name ASC
+    """
+)
+
+
 class Language(Enum):
     GERMAN = "german"
     ENGLISH = "english"
@@ -35,6 +49,7 @@ class InfoChannel:
     levels: List[int]
     post_to: List[int]
     gyms: List[Gym]
+    gym_ids: Set[str]
     channel: discord.TextChannel
 
     def __init__(self, id_: int, levels: List[int], post_to: Optional[List[int]] = None):
@@ -48,6 +63,7 @@ class InfoChannel:
 
     def set_gyms(self, gyms: List[Gym]):
         self.gyms = gyms
+        self.gym_ids = {g.id for g in gyms}
 
 
 class DMapMessage:
@@ -106,7 +122,8 @@ class _MatcherMethods:
 class Server:
     name: str
     id: int
-    geofence: str
+    geofence_names: List[str]
+    geofences: List[Geofence]
     raid_channels: List[RaidChannel]
     info_channels: List[InfoChannel]
     dmap_messages: List[DMapMessage]
@@ -114,63 +131,41 @@ class Server:
     gyms: List[Gym]
     guild: discord.Guild
     _bot: TaubsiBot
-    _raw_fences: list
     gym_dict: Dict[str, Gym]
-    _sql_fence: Optional[str] = None
+    _last_fence_refresh: Optional[arrow.Arrow] = None
 
     def __init__(self,
                  name: str,
                  id_: int,
-                 geofence: str,
+                 geofence: Union[str, List[str]],
                  raid_channels: List[RaidChannel],
                  info_channels: List[InfoChannel],
                  dmap_messages: List[DMapMessage],
                  team_choose: List[int]):
         self.name = name
         self.id = id_
-        self.geofence = geofence.lower()
+        if isinstance(geofence, str):
+            geofence = [geofence]
+        self.geofence_names = [g.lower() for g in geofence]
         self.raid_channels = raid_channels
         self.info_channels = info_channels
         self.dmap_messages = dmap_messages
         self.team_choose_ids = team_choose
-
-        with open("geofence.json", "r") as f:
-            self._raw_fences = json.load(f)
-
-    @staticmethod
-    def _convert_path_sql(fence):
-        sql_fence = []
-        for lat, lon in fence:
-            sql_fence.append(f"{lat} {lon}")
-        sql_fence.append(f"{fence[0][0]} {fence[0][1]}")
-
-        return "(" + ",".join(sql_fence) + ")"
+        self.geofences = []
 
     async def load(self, bot: TaubsiBot):
         self._bot = bot
-        for fence in self._raw_fences:
-            if fence["name"].lower() == self.geofence.lower():
-                self._sql_fence = self._convert_path_sql(fence["path"])
-                break
-        if not self._sql_fence:
-            log.error(f"No geofence found for {self.name}")
-            raise
-
-        query = (
-            f"select name, gym.gym_id as id, url, latitude, longitude "
-            f"from gymdetails "
-            f"left join gym on gym.gym_id = gymdetails.gym_id "
-            f"where ST_CONTAINS(ST_GEOMFROMTEXT('POLYGON({self._sql_fence})'), point(latitude, longitude)) "
-            f"order by name asc"
-        )
-        gyms = await bot.mad_db.execute(query)
+        fences = load_geofences()
+        for name in self.geofence_names:
+            fence = fences.get(name)
+            if fence is None:
+                log.error(f"No geofence {name} found for {self.name}")
+                raise
+            self.geofences.append(fence)
 
         self.gyms = []
         self.gym_dict = {}
-        for gym_data in gyms:
-            gym = Gym(bot, self, gym_data)
-            self._add_gym(gym)
-        await self.update_gyms()
+        await self.load_gyms()
 
         self.guild = await bot.fetch_guild(self.id)
 
@@ -178,23 +173,31 @@ class Server:
         self.gyms.append(gym)
         self.gym_dict[gym.id] = gym
 
-    async def update_gyms(self):
-        query = (
-            f"select gym.gym_id as id, url, team_id as team, latitude, longitude, raid.level, raid.start, raid.end, "
-            f"raid.move_1, raid.move_2, raid.pokemon_id, raid.form, raid.costume, raid.evolution "
-            f"from gym "
-            f"left join gymdetails on gymdetails.gym_id = gym.gym_id "
-            f"left join raid on raid.gym_id = gym.gym_id "
-            f"where ST_CONTAINS(ST_GEOMFROMTEXT('POLYGON({self._sql_fence})'), point(latitude, longitude))"
-        )
-        gyms = await self._bot.mad_db.execute(query)
-        for data in gyms:
-            gym = self.get_gym(data["id"])
-            if gym:
-                gym.update(data)
-            else:
-                gym = Gym(self._bot, self, data)
-                self._add_gym(gym)
+    async def load_gyms(self):
+        """
+        Resolves the geofences to the gyms inside them. The database only does a cheap bounding box lookup,
+        the polygons are checked locally. Raid polls in the GymStore afterwards only look up gym IDs
+        """
+        for fence in self.geofences:
+            gyms = await self._bot.mad_db.execute(GYMS_QUERY, args=fence.bbox)
+            if not gyms:
+                continue
+            inside = fence.contains_many([g["latitude"] for g in gyms], [g["longitude"] for g in gyms])
+            for gym_data, is_inside in zip(gyms, inside):
+                if not is_inside:
+                    continue
+                gym = self._bot.gym_store.add(self, gym_data)
+                if gym.id not in self.gym_dict:
+                    self._add_gym(gym)
+
+        # each fence's gyms come sorted by name, the merged list doesn't
+        self.gyms.sort(key=lambda g: (g.name or "").lower())
+        self._last_fence_refresh = arrow.utcnow()
+
+    def needs_fence_refresh(self) -> bool:
+        if self._last_fence_refresh is None:
+            return True
+        return self._last_fence_refresh.shift(seconds=self._bot.config.GYM_FENCE_REFRESH_INTERVAL) < arrow.utcnow()
 
     def get_gym(self, id_: str) -> Optional[Gym]:
         return self.gym_dict.get(id_)
@@ -253,6 +256,37 @@ class BaseConfig:
     DB_PORT: int = 3306
     DB_USER: str
     DB_PASS: str
+    DB_POOL_MIN_SIZE: int = 1
+    DB_POOL_MAX_SIZE: int = 10
+    DB_POOL_RECYCLE: int = 3600  # seconds after which idle connections get replaced
+    DB_WRITE_INTERVAL: float = 2  # seconds raid writes are buffered before being written together
+    DB_WRITE_BATCH_SIZE: int = 100  # amount of buffered rows that trigger an early write
+
+    GYM_FULL_SYNC_INTERVAL: int = 300  # seconds between full gym polls. polls in between only fetch changes
+    GYM_FENCE_REFRESH_INTERVAL: int = 3600  # seconds between looking for new gyms inside the geofence
+
+    RAID_EDIT_INTERVAL: float = 1.5  # min. seconds between two edits of a raid message. changes in between are merged
+    NOTIFY_WORKERS: int = 4  # amount of DMs that are sent at the same time
+    NOTIFY_MAX_RETRIES: int = 3  # retries for a DM that got rate limited
+    ROLE_SYNC_INTERVAL: float = 2  # seconds raid role changes are collected before being applied
+    ROLE_SYNC_BATCH_SIZE: int = 10  # max. members whose roles are updated per interval
+    RAID_RESTORE_CONCURRENCY: int = 5  # raids that are restored at the same time on startup
+
+    HTTP_LIMIT_PER_HOST: int = 8  # max. open connections per host for outgoing requests
+    HTTP_TIMEOUT: float = 30  # seconds until an outgoing request is given up
+    HTTP_RETRIES: int = 2  # retries for failed requests, with backoff
+    HTTP_MAX_SIZE: int = 50 * 1024 * 1024  # max. bytes of a response
+
+    IMAGE_CACHE_DIR: str = "cache"  # where rendered images are kept
+    RAID_IMAGE_CACHE_SIZE: int = 500  # max. amount of cached raid icons
+    COUNTER_IMAGE_CACHE_SIZE: int = 100  # max. amount of cached counter images
+    IMAGE_URL_TTL: float = 20 * 3600  # seconds an uploaded image is reused if its URL has no expiry
+    IMAGE_EXECUTOR: str = "thread"  # where images are rendered: "thread" or "process"
+    IMAGE_WORKERS: int = 2  # images that can be rendered at the same time
+    IMAGE_SERVER_URL: str = ""  # public URL of the built-in image server. empty to upload to the trash channel
+    IMAGE_SERVER_HOST: str = "0.0.0.0"  # address the image server listens on
+    IMAGE_SERVER_PORT: int = 8080  # port the image server listens on
+    IMAGE_SERVER_KEEP_DAYS: float = 7  # days an image is served after it was last used
 
     DMAP_STYLES: List[Style]
     DMAP_MARKER_LIMIT: int
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import asyncio
+from enum import Enum
+from typing import List, Set, Optional, Callable, Awaitable, Iterable, TYPE_CHECKING
+
+from taubsi.core.logging import log
+
+if TYPE_CHECKING:
+    from taubsi.core.pogo import Gym, Raid
+
+
+class GymEventType(Enum):
+    RAID_APPEARED = 0
+    RAID_HATCHED = 1
+    BOSS_CHANGED = 2
+    RAID_EXPIRED = 3
+    TEAM_CHANGED = 4
+
+    @classmethod
+    def raid_changes(cls):
+        return [cls.RAID_APPEARED, cls.RAID_HATCHED, cls.BOSS_CHANGED]
+
+
+class GymEvent:
+    type: GymEventType
+    gym: Gym
+    old_raid: Optional[Raid]
+
+    def __init__(self, type_: GymEventType, gym: Gym, old_raid: Optional[Raid] = None):
+        self.type = type_
+        self.gym = gym
+        self.old_raid = old_raid
+
+    def __repr__(self):
+        return f"<GymEvent {self.type.name} gym={self.gym.id}>"
+
+
+EventCallback = Callable[[GymEvent], Awaitable[None]]
+
+
+class Subscription:
+    """
+    Feeds events into its own queue, so a slow consumer never holds up the gym loop or other consumers.
+    Events are handled one after another, in the order they were emitted
+    """
+    callback: EventCallback
+    types: Set[GymEventType]
+    queue: asyncio.Queue
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, callback: EventCallback, types: Iterable[GymEventType]):
+        self.callback = callback
+        self.types = set(types)
+        self.queue = asyncio.Queue()
+        self._task = loop.create_task(self._process())
+
+    def put(self, event: GymEvent):
+        self.queue.put_nowait(event)
+
+    def cancel(self):
+        self._task.cancel()
+
+    async def _process(self):
+        while True:
+            event: GymEvent = await self.queue.get()
+            try:
+                await self.callback(event)
+            except Exception as e:
+                log.error(f"Exception while handling {event}")
+                log.exception(e)
+            self.queue.task_done()
+
+
+class EventBus:
+    _subscriptions: List[Subscription]
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._subscriptions = []
+
+    def subscribe(self, callback: EventCallback, types: Iterable[GymEventType]) -> Subscription:
+        subscription = Subscription(self._loop, callback, types)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscription.cancel()
+        self._subscriptions.remove(subscription)
+
+    def emit(self, event: GymEvent):
+        log.debug(f"Emitting {event}")
+        for subscription in self._subscriptions:
+            if event.type in subscription.types:
+                subscription.put(event)
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import json
+from typing import List, Dict, Tuple, Iterable, Optional
+
+import numpy as np
+
+GEOFENCE_FILE = "geofence.json"
+
+_fences: Optional[Dict[str, Geofence]] = None
+
+
+class Geofence:
+    """
+    A polygon from geofence.json that can classify coordinates without asking the database.
+    Points are first checked against the bounding box, the rest is decided by vectorized ray-casting
+    """
+    name: str
+    lats: np.ndarray
+    lons: np.ndarray
+    bbox: Tuple[float, float, float, float]  # min lat, max lat, min lon, max lon
+
+    def __init__(self, name: str, path: List[List[float]]):
+        self.name = name
+        points = np.asarray(path, dtype=np.float64)
+        self.lats = points[:, 0]
+        self.lons = points[:, 1]
+        # plain floats, so the database driver can escape them
+        self.bbox = (float(self.lats.min()), float(self.lats.max()), float(self.lons.min()), float(self.lons.max()))
+
+    def __repr__(self):
+        return f"<Geofence {self.name}>"
+
+    def in_bbox(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        min_lat, max_lat, min_lon, max_lon = self.bbox
+        return (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+
+    def intersects_bbox(self, min_lat: float, max_lat: float, min_lon: float, max_lon: float) -> bool:
+        """
+        Whether an area, e.g. a map viewport, overlaps with the fence's bounding box
+        """
+        return not (max_lat < self.bbox[0] or min_lat > self.bbox[1]
+                    or max_lon < self.bbox[2] or min_lon > self.bbox[3])
+
+    def contains_many(self, lats: Iterable[float], lons: Iterable[float]) -> np.ndarray:
+        """
+        Returns a bool array telling which of the given points are inside the fence
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        result = self.in_bbox(lats, lons)
+        if not result.any():
+            return result
+
+        candidate_lats = lats[result]
+        candidate_lons = lons[result]
+        inside = np.zeros(len(candidate_lats), dtype=bool)
+
+        # every edge a horizontal ray from the point crosses flips the point between outside and inside
+        prev_lats = np.roll(self.lats, 1)
+        prev_lons = np.roll(self.lons, 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for lat1, lon1, lat2, lon2 in zip(self.lats, self.lons, prev_lats, prev_lons):
+                spans = (lon1 > candidate_lons) != (lon2 > candidate_lons)
+                crossing = (lat2 - lat1) * (candidate_lons - lon1) / (lon2 - lon1) + lat1
+                inside ^= spans & (candidate_lats < crossing)
+
+        result[result] = inside
+        return result
+
+    def contains(self, lat: float, lon: float) -> bool:
+        return bool(self.contains_many([lat], [lon])[0])
+
+
+def load_geofences() -> Dict[str, Geofence]:
+    """
+    Reads geofence.json once and returns all fences by their lowercase name
+    """
+    global _fences
+    if _fences is None:
+        with open(GEOFENCE_FILE, "r") as f:
+            raw_fences = json.load(f)
+        _fences = {}
+        for raw_fence in raw_fences:
+            fence = Geofence(raw_fence["name"], raw_fence["path"])
+            _fences[fence.name.lower()] = fence
+    return _fences
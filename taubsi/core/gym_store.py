@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Dict, Optional, Any, TYPE_CHECKING
+
+import arrow
+
+from taubsi.core.pogo import Gym
+from taubsi.core.queries import Query
+
+if TYPE_CHECKING:
+    from taubsi.core.bot import TaubsiBot
+    from taubsi.core.config_classes import Server
+
+
+_GYM_UPDATE_SQL = """
+    SELECT gym.gym_id AS id, url, team_id AS team, latitude, longitude, raid.level, raid.start, raid.end,
+    raid.move_1, raid.move_2, raid.pokemon_id, raid.form, raid.costume, raid.evolution,
+    gym.last_modified AS gym_modified, raid.last_scanned AS raid_scanned
+    FROM gym
+    LEFT JOIN gymdetails ON gymdetails.gym_id = gym.gym_id
+    LEFT JOIN raid ON raid.gym_id = gym.gym_id
+    WHERE gym.gym_id IN %s
+"""
+GYM_UPDATE_QUERY = Query("gym_raids", _GYM_UPDATE_SQL)
+# only rows that changed since the last poll. >= so rows written in the same second as the watermark aren't missed.
+# gym.last_modified is the game's time and raid.last_scanned the scanner's, so each column has its own watermark
+GYM_DELTA_QUERY = Query(
+    "gym_raid_changes",
+    _GYM_UPDATE_SQL + "AND (gym.last_modified >= %s OR raid.last_scanned >= %s)"
+)
+# used while a column had no value yet, e.g. no raid was ever scanned
+NO_WATERMARK = datetime(1970, 1, 1)
+
+
+class GymStore:
+    """
+    Holds the gyms of all servers. A gym inside multiple geofences is one shared object,
+    so a single poll for the union of all fences updates every server at once
+    """
+    gyms: Dict[str, Gym]
+    _active_raids: Dict[str, Gym]
+    _bot: TaubsiBot
+    _gym_watermark: Optional[datetime] = None
+    _raid_watermark: Optional[datetime] = None
+    _last_full_sync: Optional[arrow.Arrow] = None
+
+    def __init__(self, bot: TaubsiBot):
+        self._bot = bot
+        self.gyms = {}
+        self._active_raids = {}
+
+    def get(self, id_: str) -> Optional[Gym]:
+        return self.gyms.get(id_)
+
+    def add(self, server: Server, data: Dict[str, Any]) -> Gym:
+        """
+        Returns the shared gym for this data, creating it if no server knew about it yet
+        """
+        gym = self.gyms.get(data["id"])
+        if gym:
+            gym.update(data)
+        else:
+            gym = Gym(self._bot, server, data)
+            self.gyms[gym.id] = gym
+        return gym
+
+    def _needs_full_sync(self) -> bool:
+        if self._last_full_sync is None:
+            return True
+        return self._last_full_sync.shift(seconds=self._bot.config.GYM_FULL_SYNC_INTERVAL) < arrow.utcnow()
+
+    async def update(self):
+        """
+        Polls gyms and raids that changed since the last poll.
+        Every GYM_FULL_SYNC_INTERVAL seconds, all gyms are fetched again as a safety net
+        """
+        for server in self._bot.servers:
+            if server.needs_fence_refresh():
+                await server.load_gyms()
+        if not self.gyms:
+            return
+
+        gym_ids = tuple(self.gyms.keys())
+        if self._needs_full_sync():
+            self._last_full_sync = arrow.utcnow()
+            gyms = await self._bot.mad_db.execute(GYM_UPDATE_QUERY, args=(gym_ids,))
+        else:
+            gyms = await self._bot.mad_db.execute(GYM_DELTA_QUERY, args=(
+                gym_ids, self._gym_watermark or NO_WATERMARK, self._raid_watermark or NO_WATERMARK
+            ))
+
+        for data in gyms:
+            # the watermarks follow the database's values, so the bot's clock doesn't matter
+            gym_modified = data["gym_modified"]
+            if gym_modified is not None and (self._gym_watermark is None or gym_modified > self._gym_watermark):
+                self._gym_watermark = gym_modified
+            raid_scanned = data["raid_scanned"]
+            if raid_scanned is not None and (self._raid_watermark is None or raid_scanned > self._raid_watermark):
+                self._raid_watermark = raid_scanned
+
+            gym = self.get(data["id"])
+            if gym:
+                gym.update(data)
+                if gym.raid and not gym.raid.has_ended:
+                    self._active_raids[gym.id] = gym
+
+        self._expire_raids()
+
+    def _expire_raids(self):
+        """
+        Only looks at gyms with a running raid, not at every gym
+        """
+        for gym in list(self._active_raids.values()):
+            if gym.raid is None or gym.raid.has_ended:
+                self._active_raids.pop(gym.id)
+                gym.expire_raid()
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import re
+import time
+from typing import Optional
+
+from aiohttp import web
+
+from taubsi.core.logging import log
+
+IMAGE_NAME = re.compile(r"^[0-9a-f]{64}\.png$")
+# a file's name is the hash of its content, so a URL never points to anything else
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+PRUNE_INTERVAL = 3600
+
+
+class ImageServer:
+    """
+    Serves rendered images over HTTP, by the hash of their content.
+    Used instead of uploading every image to the trash channel if IMAGE_SERVER_URL is set.
+    Images that weren't stored for `keep_days` are deleted
+    """
+    _runner: Optional[web.AppRunner] = None
+    _prune_task: Optional[asyncio.Task] = None
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, path: str, host: str, port: int, public_url: str,
+                 keep_days: float):
+        self._loop = loop
+        self.path = path
+        self.host = host
+        self.port = port
+        self.public_url = public_url.rstrip("/")
+        self.keep_days = keep_days
+
+        self.app = web.Application()
+        self.app.router.add_get("/images/{name}", self.handle_image)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def store(self, png: bytes) -> str:
+        """
+        Writes the image to disk, if it isn't already, and returns its public URL
+        """
+        name = hashlib.sha256(png).hexdigest() + ".png"
+        file = self._file(name)
+        if os.path.exists(file):
+            # marks it as used, so it isn't pruned
+            os.utime(file)
+        else:
+            os.makedirs(self.path, exist_ok=True)
+            temp_file = file + ".tmp"
+            with open(temp_file, "wb") as f:
+                f.write(png)
+            os.replace(temp_file, file)
+        return f"{self.public_url}/images/{name}"
+
+    async def handle_image(self, request: web.Request) -> web.StreamResponse:
+        name = request.match_info["name"]
+        if not IMAGE_NAME.match(name):
+            raise web.HTTPNotFound()
+
+        etag = f'"{name[:-4]}"'
+        headers = {"Cache-Control": CACHE_CONTROL, "ETag": etag}
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers=headers)
+
+        file = self._file(name)
+        if not os.path.exists(file):
+            raise web.HTTPNotFound()
+        return web.FileResponse(file, headers=headers)
+
+    def prune(self):
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return
+        oldest = time.time() - self.keep_days * 24 * 3600
+        removed = 0
+        for name in names:
+            if not IMAGE_NAME.match(name):
+                continue
+            try:
+                if os.path.getmtime(self._file(name)) < oldest:
+                    os.remove(self._file(name))
+                    removed += 1
+            except OSError:
+                pass
+        if removed:
+            log.info(f"Removed {removed} old images from the image server")
+
+    async def _prune_loop(self):
+        while True:
+            await self._loop.run_in_executor(None, self.prune)
+            await asyncio.sleep(PRUNE_INTERVAL)
+
+    async def start(self):
+        if self._runner is not None:
+            return
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self._prune_task = self._loop.create_task(self._prune_loop())
+        log.info(f"Serving images on {self.host}:{self.port} as {self.public_url}")
+
+    async def close(self):
+        if self._prune_task is not None:
+            self._prune_task.cancel()
+            self._prune_task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import List, Deque, Iterable, Optional, Tuple
+
+import discord
+
+from taubsi.core.logging import log
+
+_Job = Tuple[discord.abc.Messageable, discord.Embed, float]
+
+
+class NotificationDispatcher:
+    """
+    Sends DMs in the background. Every recipient is bound to one worker, so messages to the same user stay in order
+    and share their rate limit bucket, while different users are served in parallel.
+    Callers only queue and never wait for Discord
+    """
+    _queues: List[asyncio.Queue]
+    _tasks: List[asyncio.Task]
+    _latencies: Deque[float]
+    sent: int = 0
+    failed: int = 0
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, workers: int = 4, max_retries: int = 3):
+        self._loop = loop
+        self._workers = max(1, workers)
+        self._max_retries = max_retries
+        self._queues = []
+        self._tasks = []
+        self._latencies = deque(maxlen=100)
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    @property
+    def average_latency(self) -> Optional[float]:
+        """
+        Average seconds between queueing and delivering the last 100 notifications
+        """
+        if not self._latencies:
+            return None
+        return sum(self._latencies) / len(self._latencies)
+
+    def _start(self):
+        for _ in range(self._workers):
+            queue = asyncio.Queue()
+            self._queues.append(queue)
+            self._tasks.append(self._loop.create_task(self._process_queue(queue)))
+
+    def send(self, embed: discord.Embed, recipients: Iterable[discord.abc.Messageable]):
+        """
+        Queues the same embed for all recipients
+        """
+        if not self._queues:
+            self._start()
+        queued_at = time.monotonic()
+        for recipient in recipients:
+            queue = self._queues[recipient.id % len(self._queues)]
+            queue.put_nowait((recipient, embed, queued_at))
+
+    def close(self):
+        for task in self._tasks:
+            task.cancel()
+
+    async def _process_queue(self, queue: asyncio.Queue):
+        while True:
+            job: _Job = await queue.get()
+            try:
+                await self._deliver(*job)
+            except Exception as e:
+                log.error(f"Exception while sending a notification to {job[0]}")
+                log.exception(e)
+            queue.task_done()
+
+    async def _deliver(self, recipient: discord.abc.Messageable, embed: discord.Embed, queued_at: float):
+        tries = 0
+        while True:
+            try:
+                await recipient.send(embed=embed)
+                break
+            except discord.Forbidden:
+                # DMs closed, nothing to retry
+                log.info(f"Can't send notifications to {recipient}")
+                self.failed += 1
+                return
+            except discord.HTTPException as e:
+                if e.status != 429 or tries >= self._max_retries:
+                    log.error(f"Couldn't send a notification to {recipient}")
+                    log.exception(e)
+                    self.failed += 1
+                    return
+                tries += 1
+                await asyncio.sleep(2 ** tries)
+
+        self.sent += 1
+        latency = time.monotonic() - queued_at
+        self._latencies.append(latency)
+        log.debug(f"Sent notification to {recipient} after {latency:.2f}s, {self.queue_depth} left in queue")
@@ -9,6 +9,7 @@ from typing import Dict, Any, Optional, TYPE_CHECKING
 import arrow
 
 from taubsi.pogodata import Pokemon, Move
+from taubsi.core.events import GymEvent, GymEventType
 
 if TYPE_CHECKING:
     from taubsi.core.bot import TaubsiBot
@@ -145,6 +146,10 @@ class Raid:
             return self.is_predicted
         return self.start < arrow.utcnow()
 
+    @property
+    def has_ended(self) -> bool:
+        return self.is_scanned and self.end < arrow.utcnow()
+
 
 class Gym:
     ANONYMIZE = False
@@ -157,12 +162,14 @@ class Gym:
     team: Team = Team.NOTEAM
     server: Server
     _bot: TaubsiBot
+    _loaded: bool = False
 
     def __init__(self, bot_: TaubsiBot, server: Server, data: Dict[str, Any]):
         self._bot = bot_
         self.server = server
         self.id = data.get("id")
         self.update(data)
+        self._loaded = True
 
     def __repr__(self):
         return self.name
@@ -170,12 +177,20 @@ class Gym:
     def __str__(self):
         return self.name
 
+    def _emit(self, type_: GymEventType, old_raid: Optional[Raid] = None):
+        if self._loaded:
+            self._bot.events.emit(GymEvent(type_, self, old_raid))
+
     def update(self, data: Dict[str, Any] = None):
         self.name = data.get("name", self.name)
         self.img = data.get("url", self.img)
         self.lat = data.get("latitude", self.lat)
         self.lon = data.get("longitude", self.lon)
-        self.team = Team(data.get("team", self.team.value))
+
+        team = Team(data.get("team", self.team.value))
+        if team != self.team:
+            self.team = team
+            self._emit(GymEventType.TEAM_CHANGED)
 
         if self.ANONYMIZE:
             images = [
@@ -197,8 +212,25 @@ class Gym:
             return
 
         raid = Raid(self._bot, data)
-        if raid != self.raid:
+        old_raid = self.raid
+        if old_raid is None or old_raid.has_ended:
+            if old_raid is not None and raid.has_ended:
+                return
+            self.raid = raid
+            if not raid.has_ended:
+                self._emit(GymEventType.RAID_APPEARED, old_raid)
+        elif raid != old_raid:
             self.raid = raid
+            if raid.boss and not raid.is_predicted and (not old_raid.boss or old_raid.is_predicted):
+                self._emit(GymEventType.RAID_HATCHED, old_raid)
+            else:
+                self._emit(GymEventType.BOSS_CHANGED, old_raid)
+
+    def expire_raid(self):
+        """
+        Called by the GymStore once the current raid has ended
+        """
+        self._emit(GymEventType.RAID_EXPIRED, self.raid)
 
     def get_raid(self, level: int = 0) -> Raid:
         """
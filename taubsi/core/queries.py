@@ -1,19 +1,158 @@
+import asyncio
+from typing import Optional, Union, Dict, List, Tuple, Any
+
 import aiomysql
 
+# "MySQL server has gone away", raised when sending a query over a connection the server already closed.
+# the query never reached the server, so it's safe to send it again
+CR_SERVER_GONE_ERROR = 2006
+
+from taubsi.core.logging import log
+
+
+class Query:
+    """
+    A named, reusable SQL statement. Values are never formatted into it, they're passed as args on execution
+    """
+    name: str
+    sql: str
+
+    def __init__(self, name: str, sql: str):
+        self.name = name
+        # normalize whitespace once so every execution sends the exact same statement text
+        self.sql = " ".join(sql.split())
+
+    def __repr__(self):
+        return f"<Query {self.name}>"
+
+    def __str__(self):
+        return self.sql
+
+
+class WriteBuffer:
+    """
+    Collects upserts per table and primary key and writes them as multi-row statements.
+    Rows are flushed after `interval` seconds or as soon as `max_size` rows are pending.
+    Later writes to the same key are merged into the pending row.
+    """
+    _queries: "Queries"
+    _pending: Dict[str, Dict[Tuple[Any, ...], Dict[str, Any]]]
+    _size: int
+    _flush_task: Optional[asyncio.Task] = None
+
+    def __init__(self, queries: "Queries", loop, interval: float, max_size: int):
+        self._queries = queries
+        self._loop = loop
+        self.interval = interval
+        self.max_size = max_size
+        self._pending = {}
+        self._size = 0
+        self._lock = asyncio.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def add(self, table: str, keyvals: Dict[str, Any], primary_key: Tuple[str, ...]):
+        key = tuple(keyvals[k] for k in primary_key)
+        rows = self._pending.setdefault(table, {})
+        if key in rows:
+            rows[key].update(keyvals)
+        else:
+            rows[key] = dict(keyvals)
+            self._size += 1
+
+        if self._size >= self.max_size:
+            self._loop.create_task(self.flush())
+        elif self._flush_task is None:
+            self._flush_task = self._loop.create_task(self._delayed_flush())
+
+    async def discard(self, table: str, key: Tuple[Any, ...]):
+        """
+        Drops a pending row, e.g. because the row is about to be deleted.
+        Also waits for a flush that's already writing it, so a following DELETE can't be overtaken by it
+        """
+        if self._pending.get(table, {}).pop(key, None) is not None:
+            self._size -= 1
+        async with self._lock:
+            pass
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.interval)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            pending = self._pending
+            self._pending = {}
+            self._size = 0
+
+            for table, rows in pending.items():
+                # rows of the same table can still have different columns, e.g. raids with and without a boss
+                by_columns: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+                for row in rows.values():
+                    by_columns.setdefault(tuple(row.keys()), []).append(row)
+
+                for column_rows in by_columns.values():
+                    try:
+                        await self._queries.insert_many(table, column_rows)
+                    except Exception as e:
+                        log.error(f"Failed to write {len(column_rows)} buffered rows to {table}")
+                        log.exception(e)
+
 
 class Queries:
+    _pool: Optional[aiomysql.Pool] = None
+    write_buffer: WriteBuffer
+
     def __init__(self, config, loop, dbname):
         self.config = config
+        self.dbname = dbname
         self.pool_kwargs = {
             "db": dbname,
             "host": config.DB_HOST,
             "port": config.DB_PORT,
             "user": config.DB_USER,
             "password": config.DB_PASS,
+            "minsize": config.DB_POOL_MIN_SIZE,
+            "maxsize": config.DB_POOL_MAX_SIZE,
+            "pool_recycle": config.DB_POOL_RECYCLE,
+            # connections are long-lived now. without autocommit, a connection would keep reading
+            # from the snapshot of its first select and never see new raids
+            "autocommit": True,
             "loop": loop
         }
-        
-    async def execute(self, query: str, result=True, commit=False, args=None, as_dict=True):
+        self._pool_lock = asyncio.Lock()
+        self.write_buffer = WriteBuffer(self, loop, config.DB_WRITE_INTERVAL, config.DB_WRITE_BATCH_SIZE)
+
+    async def connect(self) -> aiomysql.Pool:
+        """
+        Returns the shared pool, creating it on first use
+        """
+        if self._pool is not None:
+            return self._pool
+        async with self._pool_lock:
+            if self._pool is None:
+                log.info(f"Opening connection pool for database {self.dbname}")
+                self._pool = await aiomysql.create_pool(**self.pool_kwargs)
+        return self._pool
+
+    async def close(self):
+        if len(self.write_buffer):
+            # connects if there's no pool yet. rows that can't be written are logged by flush()
+            await self.write_buffer.flush()
+        if self._pool is None:
+            return
+        log.info(f"Closing connection pool for database {self.dbname}")
+        pool = self._pool
+        self._pool = None
+        pool.close()
+        await pool.wait_closed()
+
+    async def execute(self, query: Union[Query, str], result=True, commit=False, args=None, as_dict=True):
+        if isinstance(query, Query):
+            log.debug(f"Executing {query!r} on {self.dbname}")
+            query = query.sql
         if as_dict:
             conn_args = (aiomysql.DictCursor, )
         else:
@@ -22,17 +161,23 @@ class Queries:
             args = []
         r = None
 
-        pool = await aiomysql.create_pool(**self.pool_kwargs)
-        async with pool.acquire() as conn:
-            async with conn.cursor(*conn_args) as cursor:
-                await cursor.execute(query, args)
-                if result:
-                    r = await cursor.fetchall()
-                if commit:
-                    await conn.commit()
-        pool.close()
-        await pool.wait_closed()
-        return r
+        pool = await self.connect()
+        for attempt in range(2):
+            try:
+                async with pool.acquire() as conn:
+                    async with conn.cursor(*conn_args) as cursor:
+                        await cursor.execute(query, args)
+                        if result:
+                            r = await cursor.fetchall()
+                        if commit:
+                            await conn.commit()
+                return r
+            except aiomysql.OperationalError as e:
+                # connections the server dropped while they were idle in the pool. the failed one is closed
+                # and not handed out again
+                if attempt or not e.args or e.args[0] != CR_SERVER_GONE_ERROR:
+                    raise
+                log.info(f"Connection to {self.dbname} was dropped, retrying on another one")
 
     def __process_literals(self, optype, keyvals, literals):
         """ Processes literals and returns a tuple containing all data required for the query
@@ -117,3 +262,42 @@ class Queries:
             column_values += ondupe_values
 
         await self.execute(query, args=column_values, result=False, commit=True)
+
+    async def insert_many(self, table, rows, optype="ON DUPLICATE"):
+        """ Inserts multiple rows using a single statement
+        Args:
+            table (str): Table to run the query against
+            rows (list): Rows to insert. All rows need to have the same keys
+            optype (str): Type of operation.  Valid operations are ["INSERT", "REPLACE", "INSERT IGNORE",
+                "ON DUPLICATE"]
+        """
+        if not rows:
+            return
+        optype = optype.upper()
+        column_names = list(rows[0].keys())
+        inital_type = optype
+        if optype == "ON DUPLICATE":
+            inital_type = "INSERT"
+        if inital_type in ["INSERT", "REPLACE"]:
+            inital_type += " INTO"
+        rownames = ",".join("`%s`" % k for k in column_names)
+        rowvalues = "(%s)" % ", ".join("%s" for _ in column_names)
+        query = "%s %s\n" \
+                "(%s)\n" \
+                "VALUES %s" % (inital_type, table, rownames, ",\n".join(rowvalues for _ in rows))
+        if optype == "ON DUPLICATE":
+            dupe_out = ",\n".join("`%s` = VALUES(`%s`)" % (k, k) for k in column_names)
+            query += "\nON DUPLICATE KEY UPDATE\n" \
+                     "%s" % dupe_out
+
+        column_values = [row[k] for row in rows for k in column_names]
+        await self.execute(query, args=column_values, result=False, commit=True)
+
+    def insert_buffered(self, table, keyvals, primary_key):
+        """ Queues an upsert in the write buffer instead of running it right away
+        Args:
+            table (str): Table to run the query against
+            keyvals (dict): Data to insert into the table
+            primary_key (tuple): Columns that make up the table's primary key. Rows with the same key are merged
+        """
+        self.write_buffer.add(table, keyvals, primary_key)
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Dict, List, Tuple, Optional
+
+import discord
+
+from taubsi.core.logging import log
+
+
+class RoleSync:
+    """
+    Reconciles role memberships in the background. Only the latest wanted state per member and role is kept,
+    so giving and taking a role within one interval costs no API call at all.
+    Changes are applied every `interval` seconds for at most `batch_size` members, the rest waits for the next run
+    """
+    _wanted: Dict[Tuple[int, int], Tuple[discord.Member, discord.Role, bool]]
+    _deletions: Dict[int, discord.Role]
+    _flush_task: Optional[asyncio.Task] = None
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, interval: float, batch_size: int):
+        self._loop = loop
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self._wanted = {}
+        self._deletions = {}
+        self._lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self._wanted) + len(self._deletions)
+
+    def set(self, member: discord.Member, role: discord.Role, has_role: bool):
+        if role.id in self._deletions:
+            return
+        self._wanted[(role.id, member.id)] = (member, role, has_role)
+        self._schedule()
+
+    def delete_role(self, role: discord.Role):
+        """
+        Pending membership changes of the role are dropped, since its members don't matter anymore
+        """
+        for key in [k for k in self._wanted if k[0] == role.id]:
+            self._wanted.pop(key)
+        self._deletions[role.id] = role
+        self._schedule()
+
+    def _schedule(self):
+        if self._flush_task is None:
+            self._flush_task = self._loop.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(self.interval)
+        self._flush_task = None
+        await self.flush()
+        if self:
+            self._schedule()
+
+    async def flush(self):
+        async with self._lock:
+            deletions = self._deletions
+            self._deletions = {}
+            for role in deletions.values():
+                try:
+                    await role.delete()
+                except discord.NotFound:
+                    pass
+                except discord.HTTPException as e:
+                    log.error(f"Couldn't delete role {role.name}")
+                    log.exception(e)
+
+            changes: Dict[int, Tuple[discord.Member, List[discord.Role], List[discord.Role]]] = {}
+            wanted = self._wanted
+            self._wanted = {}
+            for key, (member, role, has_role) in wanted.items():
+                # changes that came in for a role while or after it was deleted are dropped for good
+                if role.id in deletions or role.id in self._deletions or role.guild.get_role(role.id) is None:
+                    continue
+                if (role in member.roles) == has_role:
+                    continue
+                if member.id not in changes:
+                    if len(changes) >= self.batch_size:
+                        # newer states that came in meanwhile win over the leftovers
+                        self._wanted.setdefault(key, (member, role, has_role))
+                        continue
+                    changes[member.id] = (member, [], [])
+                changes[member.id][1 if has_role else 2].append(role)
+
+            for member, to_add, to_remove in changes.values():
+                try:
+                    if to_add:
+                        await member.add_roles(*to_add)
+                    if to_remove:
+                        await member.remove_roles(*to_remove)
+                except discord.HTTPException as e:
+                    log.error(f"Couldn't update the roles of {member}")
+                    log.exception(e)
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import List, Tuple, Callable, Awaitable, Optional
+
+import arrow
+
+from taubsi.core.logging import log
+
+
+class ScheduledJob:
+    when: arrow.Arrow
+    name: str
+    callback: Callable[[], Awaitable]
+    cancelled: bool = False
+
+    def __init__(self, when: arrow.Arrow, callback: Callable[[], Awaitable], name: str = ""):
+        self.when = when
+        self.callback = callback
+        self.name = name
+
+    def __repr__(self):
+        return f"<ScheduledJob {self.name} at {self.when}>"
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler:
+    """
+    Runs callbacks at a given time. Jobs are kept in a heap and a single task sleeps until the earliest
+    deadline, so waiting jobs cost nothing. Jobs whose deadline already passed run right away
+    """
+    _heap: List[Tuple[float, int, ScheduledJob]]
+    _task: Optional[asyncio.Task] = None
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._heap = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, when: arrow.Arrow, callback: Callable[[], Awaitable], name: str = "") -> ScheduledJob:
+        job = ScheduledJob(when, callback, name)
+        heapq.heappush(self._heap, (when.float_timestamp, next(self._counter), job))
+        self._wakeup.set()
+        if self._task is None:
+            self._task = self._loop.create_task(self._run())
+        return job
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            timestamp, _, job = self._heap[0]
+            delay = timestamp - time.time()
+            if delay > 0:
+                # wakes up early if a job with an earlier deadline gets scheduled
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            if not job.cancelled:
+                self._loop.create_task(self._execute(job))
+
+    @staticmethod
+    async def _execute(job: ScheduledJob):
+        try:
+            await job.callback()
+        except Exception as e:
+            log.error(f"Exception while running {job}")
+            log.exception(e)
@@ -8,7 +8,7 @@ from typing import Dict, Any, Optional, List, Union, Tuple, TYPE_CHECKING
 import requests
 
 from taubsi.pogodata import Pokemon, PokemonType, Weather
-from taubsi.utils.utils import asyncget
+from taubsi.utils import http
 
 if TYPE_CHECKING:
     from taubsi.core.pogo import Gym, Raid
@@ -26,6 +26,7 @@ class IconSetManager:
         self.id = id_
 
         result = requests.get(url + "index.json")
+        http.remember(url + "index.json", result.headers)
         self.index = result.json()
         self.reload_index()
 
@@ -38,7 +39,10 @@ class IconSetManager:
             self.index.pop(key)
 
     async def reload(self):
-        self.index = await asyncget(self.url + "index.json", as_json=True)
+        index = await http.fetch(self.url + "index.json", as_json=True)
+        if index is None:
+            return
+        self.index = index
         self.reload_index()
 
 
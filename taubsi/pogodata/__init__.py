@@ -1,16 +1,20 @@
+import asyncio
+import os
+import pickle
 import re
 from enum import Enum
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Union, Tuple
 
 import requests
 
-from taubsi.utils.utils import asyncget
+from taubsi.core.logging import log
+from taubsi.utils import http
 from .move import Move
 from .pokemon import Pokemon, BaseStats
 from .pokemon_type import PokemonType, TYPES
 from .weather import Weather, WEATHERS
 from .gamemaster_models import PokemonSettings, MoveSettings
-from .enum import PogoDataEnum
+from .enum import PogoDataEnum, TemplateType, convert_enums, classify_template
 
 
 GAMEMASTER_URL = "https://raw.githubusercontent.com/PokeMiners/game_masters/master/latest/latest.json"
@@ -19,20 +23,30 @@ LOCALE_URL = "https://raw.githubusercontent.com/PokeMiners/pogo_assets/master/Te
 REMOTE_LOCALE_URL = "https://raw.githubusercontent.com/PokeMiners/pogo_assets/master/Texts/Latest%20Remote/{}.txt"
 RAIDS_URL = "https://raw.githubusercontent.com/ccev/pogoinfo/v2/active/raids.json"
 
+SNAPSHOT_FILE = "pogodata_snapshot.pickle"
+SNAPSHOT_VERSION = 2
+# enums are created at runtime, so they can't be pickled. the snapshot only keeps their members
+SNAPSHOT_ENUMS = ["pokemon_enum", "form_enum", "mega_enum", "move_enum", "type_enum", "weather_enum"]
+
 
 class PogoData:
     def __init__(self,
                  language: str,
                  raw_protos: str,
                  raw_gamemaster: List[dict],
+                 raw_locales: List[str],
                  raids: Optional[Dict[str, List[dict]]] = None
                  ):
-        self.pokemon_enum: PogoDataEnum = self._convert_enum(raw_protos, "HoloPokemonId")
-        self.form_enum: PogoDataEnum = self._convert_enum(raw_protos, "Form")
-        self.mega_enum: PogoDataEnum = self._convert_enum(raw_protos, "HoloTemporaryEvolutionId")
-        self.move_enum: PogoDataEnum = self._convert_enum(raw_protos, "HoloPokemonMove")
-        self.type_enum: PogoDataEnum = self._convert_enum(raw_protos, "HoloPokemonType")
-        self.weather_enum: PogoDataEnum = self._convert_enum(raw_protos, "WeatherCondition")
+        self.language = language
+        self.validators: Dict[str, Dict[str, str]] = {}
+        enums = convert_enums(raw_protos, ["HoloPokemonId", "Form", "HoloTemporaryEvolutionId",
+                                                 "HoloPokemonMove", "HoloPokemonType", "WeatherCondition"])
+        self.pokemon_enum: PogoDataEnum = enums["HoloPokemonId"]
+        self.form_enum: PogoDataEnum = enums["Form"]
+        self.mega_enum: PogoDataEnum = enums["HoloTemporaryEvolutionId"]
+        self.move_enum: PogoDataEnum = enums["HoloPokemonMove"]
+        self.type_enum: PogoDataEnum = enums["HoloPokemonType"]
+        self.weather_enum: PogoDataEnum = enums["WeatherCondition"]
 
         self.mon_translations: Dict[str, str] = {}
         self.form_translations: Dict[int, str] = {}
@@ -42,18 +56,93 @@ class PogoData:
         self.pokemon_settings: Dict[str, PokemonSettings] = {}
         self.move_settings: Dict[int, MoveSettings] = {}
 
+        self.__make_locale(raw_locales)
+        self.__parse_gamemaster(raw_gamemaster)
+        self.__finish(raids)
+
+    def __finish(self, raids: Optional[Dict[str, List[dict]]]):
+        # filled by Pokemon.from_pokebattler. lives on the instance, so a reload starts over
+        self.pokebattler_pokemon: Dict[str, Pokemon] = {}
+
         self.types: List[PokemonType] = []
         self.weathers: List[Weather] = []
-
         self.__make_types()
         self.__make_weathers()
-        self.__make_locale(language)
-        self.__parse_gamemaster(raw_gamemaster)
 
+        self.raw_raids = raids
+        self.raids: Dict[int, List[Pokemon]] = {}
         if raids is not None:
-            self.raids: Dict[int, List[Pokemon]] = {}
             self.__make_raids(raids)
 
+    @classmethod
+    def from_snapshot(cls, language: str, path: str = SNAPSHOT_FILE) -> Optional["PogoData"]:
+        """
+        Loads the processed data saved by save_snapshot(). Returns None if there's no usable snapshot
+        """
+        try:
+            with open(path, "rb") as f:
+                snapshot = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            log.error(f"Couldn't read the PogoData snapshot {path}, ignoring it")
+            log.exception(e)
+            return None
+        if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION \
+                or snapshot.get("language") != language:
+            return None
+
+        try:
+            self = cls.__build_from_snapshot(language, snapshot)
+        except Exception as e:
+            log.error(f"Couldn't load the PogoData snapshot {path}, ignoring it")
+            log.exception(e)
+            return None
+
+        # only once everything loaded, otherwise the next reload would think the data is up to date
+        for url, validators in self.validators.items():
+            http.set_validators(url, validators)
+        return self
+
+    @classmethod
+    def __build_from_snapshot(cls, language: str, snapshot: Dict[str, Any]) -> "PogoData":
+        self = cls.__new__(cls)
+        self.language = language
+        self.validators = snapshot["validators"]
+        for attr, (enum_name, members) in snapshot["enums"].items():
+            setattr(self, attr, PogoDataEnum(enum_name, members))
+        self.mon_translations = snapshot["mon_translations"]
+        self.form_translations = snapshot["form_translations"]
+        self.move_translations = snapshot["move_translations"]
+        self.shadow_translation = snapshot["shadow_translation"]
+        self.pokemon_settings = snapshot["pokemon_settings"]
+        self.move_settings = snapshot["move_settings"]
+        self.__finish(snapshot["raids"])
+        return self
+
+    def save_snapshot(self, path: str = SNAPSHOT_FILE):
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "language": self.language,
+            "enums": {
+                attr: (getattr(self, attr).__name__, [(e.name, e.value) for e in getattr(self, attr)])
+                for attr in SNAPSHOT_ENUMS
+            },
+            "mon_translations": self.mon_translations,
+            "form_translations": self.form_translations,
+            "move_translations": self.move_translations,
+            "shadow_translation": self.shadow_translation,
+            "pokemon_settings": self.pokemon_settings,
+            "move_settings": self.move_settings,
+            "raids": self.raw_raids,
+            "validators": self.validators
+        }
+        # write to a temporary file first, so a crash never leaves a broken snapshot behind
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
     def __make_types(self):
 
         for args in TYPES:
@@ -74,9 +163,8 @@ class PogoData:
                 type_.boosted_by = weather_
                 weather_.boosts.append(type_)
 
-    def __make_locale(self, language: str):
-        for url in [LOCALE_URL, REMOTE_LOCALE_URL]:
-            raw = requests.get(url.format(language.title())).text
+    def __make_locale(self, raw_locales: List[str]):
+        for raw in raw_locales:
             keys = re.findall(r"(?<=RESOURCE ID: ).*", raw)
             values = re.findall(r"(?<=TEXT: ).*", raw)
 
@@ -103,8 +191,8 @@ class PogoData:
 
     def __parse_gamemaster(self, raw_gamemaster: List[Dict]):
         for entry in raw_gamemaster:
-            templateid = entry.get("templateId", "")
-            if re.search(r"^V\d{4}_POKEMON_", templateid):
+            template_type = classify_template(entry.get("templateId", ""))
+            if template_type is TemplateType.POKEMON:
                 data = entry.get("data", {})
                 raw_settings = data.get("pokemonSettings", {})
                 stats = raw_settings.get("stats")
@@ -119,7 +207,7 @@ class PogoData:
 
                 self.pokemon_settings[identifier] = settings
 
-            elif re.search(r"^COMBAT_V\d{4}_MOVE_", templateid):
+            elif template_type is TemplateType.MOVE:
                 data = entry.get("data", {})
                 raw_settings = data.get("combatMove", {})
                 if not raw_settings:
@@ -130,47 +218,86 @@ class PogoData:
                 self.move_settings[move_id] = settings
 
     def __make_raids(self, raids: Dict[str, List[dict]]):
-        for level, raids in raids.items():
-            self.raids[int(level)] = [Pokemon.from_pogoinfo(d, self) for d in raids]
+        # built aside, so raids that can't be parsed leave the old ones untouched
+        new_raids = {}
+        for level, level_raids in raids.items():
+            new_raids[int(level)] = [Pokemon.from_pogoinfo(d, self) for d in level_raids]
+        self.raids.update(new_raids)
+        self.raw_raids = raids
 
     @staticmethod
-    async def _get_raids():
-        return await asyncget(RAIDS_URL, as_json=True)
+    def _sources(language: str) -> List[Tuple[str, bool]]:
+        """
+        URLs everything but raids is built from, and whether they're json
+        """
+        return [
+            (PROTO_URL, False),
+            (GAMEMASTER_URL, True),
+            (LOCALE_URL.format(language.title()), False),
+            (REMOTE_LOCALE_URL.format(language.title()), False)
+        ]
+
+    def _collect_validators(self):
+        for url, _ in self._sources(self.language) + [(RAIDS_URL, True)]:
+            validators = http.get_validators(url)
+            if validators:
+                self.validators[url] = validators
 
     @classmethod
     def make_sync(cls, language: str):
-        raw_protos = requests.get(PROTO_URL).text
-        raw_gamemaster = requests.get(GAMEMASTER_URL).json()
-        raids = requests.get(RAIDS_URL).json()
-        return cls(language, raw_protos, raw_gamemaster, raids)
+        raw = []
+        for url, as_json in cls._sources(language) + [(RAIDS_URL, True)]:
+            result = requests.get(url)
+            http.remember(url, result.headers)
+            raw.append(result.json() if as_json else result.text)
+        raw_protos, raw_gamemaster, *raw_locales, raids = raw
 
-    @classmethod
-    async def make_async(cls, language: str):
-        raw_protos = await asyncget(PROTO_URL, as_text=True)
-        raw_gamemaster = await asyncget(GAMEMASTER_URL, as_json=True)
-        return cls(language, raw_protos, raw_gamemaster)
+        self = cls(language, raw_protos, raw_gamemaster, raw_locales, raids)
+        self._collect_validators()
+        return self
 
-    async def update_raids(self):
-        raids = await self._get_raids()
+    @classmethod
+    async def make_async(cls, language: str, force: bool = False) -> Optional["PogoData"]:
+        """
+        Returns None if none of the sources changed since they were last fetched, unless force is set
+        """
+        sources = cls._sources(language)
+        # only stored once everything is built, so a failure anywhere makes the next reload fetch it all again
+        pending = {}
+        raw = []
+        for url, as_json in sources:
+            raw.append(await http.fetch(url, as_json=as_json, as_text=not as_json, conditional=not force,
+                                        pending=pending))
+        if all(r is None for r in raw):
+            return None
+
+        # sources that didn't change are still needed to build everything again
+        for i, (url, as_json) in enumerate(sources):
+            if raw[i] is None:
+                raw[i] = await http.fetch(url, as_json=as_json, as_text=not as_json, conditional=False,
+                                          pending=pending)
+        raw_protos, raw_gamemaster, *raw_locales = raw
+        raids = await http.fetch(RAIDS_URL, as_json=True, conditional=False, pending=pending)
+
+        # parsing takes a while, the event loop has to keep running meanwhile
+        loop = asyncio.get_running_loop()
+        self = await loop.run_in_executor(None, cls, language, raw_protos, raw_gamemaster, raw_locales, raids)
+        http.commit(pending)
+        self._collect_validators()
+        return self
+
+    async def update_raids(self) -> bool:
+        """
+        Returns whether raids changed
+        """
+        pending = {}
+        raids = await http.fetch(RAIDS_URL, as_json=True, pending=pending)
+        if raids is None:
+            return False
         self.__make_raids(raids)
-
-    @staticmethod
-    def _convert_enum(protos: str, enum: str) -> PogoDataEnum:
-        proto = re.findall(f"enum {enum} " + r"{[^}]*}", protos, re.IGNORECASE)
-
-        final = []
-        for entry in proto[0].split("\n"):
-            if "}" in entry or "{" in entry:
-                continue
-            entry = entry.replace(" ", "").replace(";", "").split("=")
-            final.append(
-                (
-                    entry[0].strip(),
-                    int(entry[1].strip())
-                )
-            )
-
-        return PogoDataEnum(enum, final)
+        http.commit(pending)
+        self._collect_validators()
+        return True
 
     def get_pokemon(self,
                     pokemon_id: int = 0,
@@ -1,14 +1,60 @@
+import re
 from enum import Enum
-from typing import Union
+from typing import Union, List, Dict, Tuple, Optional
+
+ENUM_PATTERN = re.compile(r"enum (\w+) {([^}]*)}", re.IGNORECASE)
 
 
 class PogoDataEnum(Enum):
     @classmethod
     def get(cls, value: Union[str, int]):
-        enum_list = list(cls)
-        if isinstance(value, str) and value.upper() in [e.name for e in enum_list]:
-            return cls[value.upper()]
-        elif isinstance(value, int) and value in [e.value for e in enum_list]:
-            return cls(value)
+        if isinstance(value, str):
+            member = cls.__members__.get(value.upper())
+        elif isinstance(value, int):
+            member = cls._value2member_map_.get(value)
         else:
-            return enum_list[0]
+            member = None
+
+        if member is None:
+            return next(iter(cls))
+        return member
+
+
+def convert_enums(protos: str, enums: List[str]) -> Dict[str, PogoDataEnum]:
+    """
+    Extracts all given enums in a single scan over the protos
+    """
+    wanted = {enum.lower(): enum for enum in enums}
+    members: Dict[str, List[Tuple[str, int]]] = {}
+    for match in ENUM_PATTERN.finditer(protos):
+        enum = wanted.get(match.group(1).lower())
+        if enum is None or enum in members:
+            continue
+
+        final = []
+        for entry in match.group(2).split(";"):
+            name, equals, value = entry.partition("=")
+            if equals:
+                final.append((name.strip(), int(value.strip())))
+        members[enum] = final
+
+        if len(members) == len(wanted):
+            break
+
+    return {enum: PogoDataEnum(enum, members[enum]) for enum in enums}
+
+
+class TemplateType(Enum):
+    POKEMON = "pokemon"
+    MOVE = "move"
+
+
+def classify_template(template_id: str) -> Optional[TemplateType]:
+    """
+    Same as ^V\\d{4}_POKEMON_ and ^COMBAT_V\\d{4}_MOVE_, without running regexes on every game master template
+    """
+    if template_id[:1] == "V" and template_id[5:14] == "_POKEMON_" and template_id[1:5].isdigit():
+        return TemplateType.POKEMON
+    if template_id[:8] == "COMBAT_V" and template_id[12:18] == "_MOVE_" and template_id[8:12].isdigit():
+        return TemplateType.MOVE
+    return None
@@ -131,6 +131,11 @@ class Pokemon:
 
     @classmethod
     def from_pokebattler(cls, name: str, pogodata: PogoData):
+        cached = pogodata.pokebattler_pokemon.get(name)
+        if cached is not None:
+            return cached
+        pokebattler_name = name
+
         mega_id = 0
         form_id = 0
         is_shadow = False
@@ -156,7 +161,7 @@ class Pokemon:
         if mon_id == 0:
             log.info(f"Could not find Mon ID for pokebattler mon {name}")
 
-        return cls(
+        pokemon = cls(
             id_=mon_id,
             pogodata=pogodata,
             form=form_id,
@@ -164,6 +169,8 @@ class Pokemon:
             mega=mega_id,
             is_shadow=is_shadow
         )
+        pogodata.pokebattler_pokemon[pokebattler_name] = pokemon
+        return pokemon
 
     def __repr__(self):
         return f"<Pokemon {self.id}>"
@@ -105,7 +105,7 @@ class Attacker(_BaseModel):
 
 
 class RaidPayload(_BaseModel):
-    _time: Arrow = PrivateAttr(default=Arrow.utcnow())
+    _time: Arrow = PrivateAttr(default_factory=Arrow.utcnow)
     attackers: List[Attacker]
     attackStrategy: str
     defenseStrategy: str
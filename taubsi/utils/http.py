@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import asyncio
+import json as json_
+from typing import Dict, Any, Optional, Mapping
+
+import aiohttp
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# overwritten by configure()
+LIMIT_PER_HOST = 8
+TIMEOUT = 30
+RETRIES = 2
+MAX_SIZE = 50 * 1024 * 1024
+
+_session: Optional[aiohttp.ClientSession] = None
+# ETag and Last-Modified of the last response per URL
+_validators: Dict[str, Dict[str, str]] = {}
+
+
+class ResponseTooLarge(aiohttp.ClientError):
+    pass
+
+
+class _Retry(Exception):
+    pass
+
+
+class Response:
+    status: int
+    headers: Mapping[str, str]
+    body: bytes
+
+    def __init__(self, status: int, headers: Mapping[str, str], body: bytes, charset: Optional[str]):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self._charset = charset or "utf-8"
+
+    def text(self) -> str:
+        return self.body.decode(self._charset, errors="replace")
+
+    def json(self) -> Any:
+        return json_.loads(self.body)
+
+
+def configure(limit_per_host: int, timeout: float, retries: int, max_size: int):
+    global LIMIT_PER_HOST, TIMEOUT, RETRIES, MAX_SIZE
+    LIMIT_PER_HOST = limit_per_host
+    TIMEOUT = timeout
+    RETRIES = retries
+    MAX_SIZE = max_size
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    One session for the whole bot, so connections and DNS lookups are reused
+    """
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit_per_host=LIMIT_PER_HOST, ttl_dns_cache=300)
+        _session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=TIMEOUT))
+    return _session
+
+
+async def close():
+    if _session is not None and not _session.closed:
+        await _session.close()
+
+
+async def _read(resp: aiohttp.ClientResponse) -> bytes:
+    if resp.content_length is not None and resp.content_length > MAX_SIZE:
+        raise ResponseTooLarge(f"{resp.url} is {resp.content_length} bytes large")
+
+    body = bytearray()
+    async for chunk in resp.content.iter_chunked(64 * 1024):
+        body += chunk
+        if len(body) > MAX_SIZE:
+            raise ResponseTooLarge(f"{resp.url} is larger than {MAX_SIZE} bytes")
+    return bytes(body)
+
+
+async def request(method: str, url: str, headers: Optional[Dict[str, str]] = None, **kwargs) -> Response:
+    """
+    Connection errors, timeouts and 429/5xx responses are retried with exponential backoff.
+    Other error statuses raise aiohttp.ClientResponseError
+    """
+    attempt = 0
+    while True:
+        try:
+            async with get_session().request(method, url, headers=headers, **kwargs) as resp:
+                if resp.status in RETRY_STATUSES and attempt < RETRIES:
+                    raise _Retry()
+                resp.raise_for_status()
+                body = b"" if resp.status == 304 else await _read(resp)
+                return Response(resp.status, resp.headers, body, resp.charset)
+        except (_Retry, aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt >= RETRIES:
+                raise
+            await asyncio.sleep(0.5 * 2 ** attempt)
+            attempt += 1
+
+
+def _extract_validators(headers: Mapping[str, str]) -> Dict[str, str]:
+    validators = {}
+    if headers.get("ETag"):
+        validators["etag"] = headers["ETag"]
+    if headers.get("Last-Modified"):
+        validators["last_modified"] = headers["Last-Modified"]
+    return validators
+
+
+def remember(url: str, headers: Mapping[str, str]):
+    """
+    Stores the validators of a response, also usable for responses of requests
+    """
+    commit({url: _extract_validators(headers)})
+
+
+def commit(pending: Dict[str, Dict[str, str]]):
+    """
+    Stores validators that fetch() put aside, once their responses were processed
+    """
+    for url, validators in pending.items():
+        if validators:
+            _validators[url] = validators
+        else:
+            _validators.pop(url, None)
+
+
+def get_validators(url: str) -> Optional[Dict[str, str]]:
+    return _validators.get(url)
+
+
+def set_validators(url: str, validators: Optional[Dict[str, str]]):
+    if validators:
+        _validators[url] = validators
+
+
+async def fetch(url: str, as_json: bool = False, as_text: bool = False, conditional: bool = True,
+                pending: Optional[Dict[str, Dict[str, str]]] = None) -> Optional[Any]:
+    """
+    Like asyncget, but sends the validators of the last response along.
+    Returns None if the server answered with 304 Not Modified.
+    If pending is given, the new validators are put there instead of being stored, see commit().
+    Otherwise a failure while processing the response would make the next fetch return 304
+    """
+    headers = {}
+    validators = _validators.get(url)
+    if conditional and validators:
+        if "etag" in validators:
+            headers["If-None-Match"] = validators["etag"]
+        if "last_modified" in validators:
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    response = await request("GET", url, headers=headers)
+    if response.status == 304:
+        return None
+
+    if as_json:
+        result = response.json()
+    elif as_text:
+        result = response.text()
+    else:
+        result = response.body
+    if pending is None:
+        remember(url, response.headers)
+    else:
+        pending[url] = _extract_validators(response.headers)
+    return result
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Any
+from urllib.parse import urlparse, parse_qs
+
+INDEX_FILE = "index.json"
+# uploaded URLs are dropped a bit before they actually expire, so embeds never show a dead link
+EXPIRY_MARGIN = 3600
+# seconds changes to the index are collected before it's written
+INDEX_SAVE_DELAY = 2
+
+
+def url_expiry(url: str, default_ttl: float) -> float:
+    """
+    Discord attachment URLs carry their expiry as a hex timestamp in the ex parameter
+    """
+    ex = parse_qs(urlparse(url).query).get("ex")
+    if ex:
+        try:
+            return int(ex[0], 16) - EXPIRY_MARGIN
+        except ValueError:
+            pass
+    return time.time() + default_ttl
+
+
+class ImageCache:
+    """
+    Rendered images on disk, by a hash of whatever they were made from, plus the URL they were uploaded to.
+    Once an URL expires, the image is still there and only needs to be uploaded again.
+    The least recently used images are removed once there are more than `max_size`.
+    The index lives in memory, files are read and written in the default executor
+    """
+    path: str
+    max_size: int
+    url_ttl: float
+    _entries: OrderedDict[str, Dict[str, Any]]
+    _save_task: Optional[asyncio.Task] = None
+
+    def __init__(self, path: str, max_size: int, url_ttl: float):
+        self.path = path
+        self.max_size = max_size
+        self.url_ttl = url_ttl
+        self._entries = OrderedDict()
+        self._save_lock = asyncio.Lock()
+        self._load_index()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        return hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key + ".png")
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.path, INDEX_FILE), "r") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        for key, entry in entries:
+            if os.path.exists(self._file(key)):
+                self._entries[key] = entry
+
+    def _write_index(self, entries: List[Tuple[str, Dict[str, Any]]]):
+        os.makedirs(self.path, exist_ok=True)
+        temp_path = os.path.join(self.path, INDEX_FILE + ".tmp")
+        with open(temp_path, "w") as f:
+            json.dump(entries, f)
+        os.replace(temp_path, os.path.join(self.path, INDEX_FILE))
+
+    def _schedule_save(self):
+        if self._save_task is None:
+            self._save_task = asyncio.get_running_loop().create_task(self._delayed_save())
+
+    async def _delayed_save(self):
+        await asyncio.sleep(INDEX_SAVE_DELAY)
+        self._save_task = None
+        async with self._save_lock:
+            await asyncio.get_running_loop().run_in_executor(None, self._write_index, list(self._entries.items()))
+
+    def _read_png(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._file(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_png(self, key: str, png: bytes):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file(key), "wb") as f:
+            f.write(png)
+
+    def _remove_pngs(self, keys: List[str]):
+        for key in keys:
+            try:
+                os.remove(self._file(key))
+            except OSError:
+                pass
+
+    def get_url(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        if entry["url"] and entry["expires"] > time.time():
+            return entry["url"]
+        return None
+
+    async def get_png(self, key: str) -> Optional[bytes]:
+        if key not in self._entries:
+            return None
+        png = await asyncio.get_running_loop().run_in_executor(None, self._read_png, key)
+        if png is None:
+            self._entries.pop(key, None)
+        return png
+
+    async def put(self, key: str, png: Optional[bytes], url: str):
+        """
+        Stores the uploaded URL of an image. png can be left out if the image is already cached
+        """
+        loop = asyncio.get_running_loop()
+        if png is not None:
+            await loop.run_in_executor(None, self._write_png, key, png)
+
+        self._entries[key] = {"url": url, "expires": url_expiry(url, self.url_ttl)}
+        self._entries.move_to_end(key)
+
+        evicted = []
+        while len(self._entries) > self.max_size:
+            old_key, _ = self._entries.popitem(last=False)
+            evicted.append(old_key)
+        if evicted:
+            await loop.run_in_executor(None, self._remove_pngs, evicted)
+        self._schedule_save()
+
+    async def cached(self, key: str) -> Tuple[Optional[str], Optional[bytes]]:
+        """
+        Returns a still valid URL or, if there's none, the PNG that can be uploaded again
+        """
+        url = self.get_url(key)
+        if url:
+            return url, None
+        return None, await self.get_png(key)
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Optional
+
+# overwritten by configure()
+KIND = "thread"
+WORKERS = 2
+
+_executor: Optional[Executor] = None
+
+
+def configure(kind: str, workers: int):
+    global KIND, WORKERS
+    KIND = kind
+    WORKERS = workers
+
+
+def get_executor() -> Executor:
+    """
+    Where the image_render functions run. Created on first use
+    """
+    global _executor
+    if _executor is None:
+        if KIND == "process":
+            _executor = ProcessPoolExecutor(max_workers=WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="image")
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
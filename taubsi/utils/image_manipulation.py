@@ -1,138 +1,150 @@
 from __future__ import annotations
+import asyncio
+import os
+from collections import OrderedDict
 from io import BytesIO
-from typing import List, Union, TYPE_CHECKING
+from typing import List, Dict, Optional, Callable, Any, TYPE_CHECKING
 
 import discord
-from PIL import Image, ImageDraw
 
 from taubsi.core.bot import bot
 from taubsi.core.logging import log
-from taubsi.pogodata import Pokemon
 from taubsi.utils.utils import asyncget
+from taubsi.utils.image_cache import ImageCache
+from taubsi.utils import image_render, image_executor
 
 if TYPE_CHECKING:
     from taubsi.core.pogo import Raid, Gym
     from taubsi.pokebattler.models import Defender
 
 
-async def upload(image: Image, name: str = "image") -> str:
-    with BytesIO() as stream:
-        image.save(stream, "PNG")
-        stream.seek(0)
-        image_msg = await bot.trash_channel.send(file=discord.File(stream, filename=f"{name}.png"))
-        final_link = image_msg.attachments[0].url
-    return final_link
-
+raid_image_cache = ImageCache(
+    os.path.join(bot.config.IMAGE_CACHE_DIR, "raids"), bot.config.RAID_IMAGE_CACHE_SIZE, bot.config.IMAGE_URL_TTL
+)
+counter_image_cache = ImageCache(
+    os.path.join(bot.config.IMAGE_CACHE_DIR, "counters"), bot.config.COUNTER_IMAGE_CACHE_SIZE, bot.config.IMAGE_URL_TTL
+)
 
-async def download_image(url: str, mode: Union[str, bool] = "RGBA") -> Image:
-    result = await asyncget(url)
-    with BytesIO(result) as stream:
-        image = Image.open(stream).copy()
-        if mode:
-            image = image.convert(mode)
-    return image
+# raw files of uicons that were used recently. they're small and never change for the same URL
+_uicons: OrderedDict[str, bytes] = OrderedDict()
+UICON_CACHE_SIZE = 256
 
 
-async def get_raid_image(gym: Gym, raid: Raid) -> str:
+async def render(func: Callable[..., bytes], *args: Any) -> bytes:
     """
-    Generate a circuar Gym Img with the boss in front of it.
-    Similiar to how it'd show on the in-game nearby view.
+    Runs one of the image_render functions without blocking the event loop
     """
+    return await asyncio.get_running_loop().run_in_executor(image_executor.get_executor(), func, *args)
 
-    log.info(f"Creating a Raid Icon for Gym {gym.name}")
 
-    gym_img = await download_image(gym.img)
-    mon = await download_image(bot.uicons.raid(raid, shiny_chance=30).url)
+async def upload_png(png: bytes, name: str = "image") -> str:
+    """
+    Returns an URL the image can be embedded with. That's the built-in image server if it's enabled,
+    the trash channel otherwise
+    """
+    if bot.image_server is not None:
+        return await asyncio.get_running_loop().run_in_executor(None, bot.image_server.store, png)
 
+    with BytesIO(png) as stream:
+        image_msg = await bot.trash_channel.send(file=discord.File(stream, filename=f"{name}.png"))
+        final_link = image_msg.attachments[0].url
+    return final_link
 
-    # gym resizing
-    size = min(gym_img.size)
-    gym_img = gym_img.crop(((gym_img.width - size) // 2,
-                            (gym_img.height - size) // 2,
-                            (gym_img.width + size) // 2,
-                            (gym_img.height + size) // 2))
 
-    mask = Image.new("L", (size * 2, size * 2), 0)
-    draw = ImageDraw.Draw(mask)
-    draw.ellipse((0, 0, size * 2 - 2, size * 2 - 2), fill=255)
-    mask = mask.resize(gym_img.size, Image.ANTIALIAS)
+async def get_uicon(url: str) -> bytes:
+    data = _uicons.get(url)
+    if data is not None:
+        _uicons.move_to_end(url)
+        return data
 
-    result = gym_img.copy()
-    result.putalpha(mask)
+    data = await asyncget(url)
+    _uicons[url] = data
+    while len(_uicons) > UICON_CACHE_SIZE:
+        _uicons.popitem(last=False)
+    return data
 
-    gym_img = result.resize((128, 128), Image.ANTIALIAS)
-    bg = Image.new("RGBA", (150, 150), 0)
-    bg.paste(gym_img)
 
-    # boss resizing & combining
+async def get_raid_image(gym: Gym, raid: Raid) -> str:
+    """
+    Generate a circuar Gym Img with the boss in front of it.
+    Similiar to how it'd show on the in-game nearby view.
+    """
 
+    uicon_url = bot.uicons.raid(raid, shiny_chance=30).url
     if raid.boss:
-        size = 105
+        boss_size = 105
     else:
-        size = 95
-    multiplier = size / max(mon.size)
-    mon_size = tuple([int(round(multiplier * s)) for s in mon.size])
+        boss_size = 95
+
+    # the same gym with the same boss always looks the same
+    key = raid_image_cache.make_key(gym.img, uicon_url, boss_size)
+    final_link, png = await raid_image_cache.cached(key)
+    if final_link:
+        log.info(f"Using a cached Raid Icon for Gym {gym.name}")
+        return final_link
+    if png:
+        log.info(f"Uploading a cached Raid Icon for Gym {gym.name} again")
+        final_link = await upload_png(png, gym.name)
+        await raid_image_cache.put(key, None, final_link)
+        return final_link
+
+    log.info(f"Creating a Raid Icon for Gym {gym.name}")
 
-    monbg = Image.new("RGBA", bg.size, 0)
-    mon = mon.resize(mon_size, Image.ANTIALIAS)
-    monbg.paste(mon, (bg.size[0] - mon.width, bg.size[1] - mon.height))
+    gym_data = await asyncget(gym.img)
+    mon_data = await get_uicon(uicon_url)
+    png = await render(image_render.render_raid_image, gym_data, mon_data, boss_size)
 
-    final_img = Image.alpha_composite(bg, monbg)
-    final_link = await upload(final_img, gym.name)
+    final_link = await upload_png(png, gym.name)
+    await raid_image_cache.put(key, png, final_link)
 
     return final_link
 
 
 class BossDetailsImage:
-    @staticmethod
-    async def pokemon_image(pokemon: Pokemon):
-        mask = Image.open("assets/counter.png").convert("L")
-        mon = await download_image(bot.uicons.pokemon(pokemon).url, mode=False)
-
-        background = Image.new("RGBA", mask.size, (255, 0, 0, 0))
-        size = 120
-        multiplier = size / max(mon.size)
-        mon_size = tuple([int(round(multiplier * s)) for s in mon.size])
-        mon = mon.resize(mon_size, Image.ANTIALIAS)
-
-        position_x = (mask.size[0] - mon.size[0]) // 2
-        position_y = (mask.size[1] - mon.size[1]) // 2
+    # counter images that are being made right now, so simultaneous clicks wait for the same one
+    _pending: Dict[str, asyncio.Task] = {}
 
-        background.paste(mon, (position_x + 10, position_y + 10))
-
-        # replace transparent pixels with color
-        alpha = background.convert('RGBA').split()[-1]
-        bg = Image.new("RGBA", background.size, (37, 38, 41, 255))
-        bg.paste(background, mask=alpha)
-
-        bg.putalpha(mask)
-
-        return bg
+    @staticmethod
+    async def get_counter_image(defenders: List[Defender], *cache_key: Any) -> str:
+        """
+        cache_key should identify the pokebattler result, e.g. boss, level and the payload's time.
+        Without one, the image is made every time
+        """
+        if not cache_key:
+            return await BossDetailsImage._make_counter_image(defenders, None)
+
+        key = counter_image_cache.make_key(*[str(k) for k in cache_key])
+        task = BossDetailsImage._pending.get(key)
+        if task is None:
+            task = asyncio.create_task(BossDetailsImage._make_counter_image(defenders, key))
+            BossDetailsImage._pending[key] = task
+            task.add_done_callback(lambda _: BossDetailsImage._pending.pop(key, None))
+        return await asyncio.shield(task)
 
     @staticmethod
-    async def get_counter_image(defenders: List[Defender]):
-        mons = []
-        count = 0
+    async def _make_counter_image(defenders: List[Defender], key: Optional[str]) -> str:
+        if key is not None:
+            final_link, png = await counter_image_cache.cached(key)
+            if final_link:
+                return final_link
+            if png:
+                final_link = await upload_png(png, "counters")
+                await counter_image_cache.put(key, None, final_link)
+                return final_link
+
+        urls = []
         for defender in defenders:
-            if defender.pokemon.mega_id or defender.pokemon.is_shadow:
+            pokemon = defender.pokemon
+            if pokemon.mega_id or pokemon.is_shadow:
                 continue
-            if count >= 6:
+            if len(urls) >= 6:
                 break
-            count += 1
-            mon_img = await BossDetailsImage.pokemon_image(defender.pokemon)
-            mons.append(mon_img)
-
-        margin = 10
-        width = len(mons) * mons[0].size[0] + ((len(mons) - 1) * margin)
-
-        height = mons[0].size[1]
-        end_result = Image.new("RGBA", (width, height), (0, 0, 0, 0))
-
-        pos = 0
-        for mon in mons:
-            end_result.paste(mon, (pos, 0))
-            pos += mon.size[0] + margin
+            urls.append(bot.uicons.pokemon(pokemon).url)
 
-        final_link = await upload(end_result, "counters")
+        mon_datas = await asyncio.gather(*[get_uicon(url) for url in urls])
+        png = await render(image_render.render_counter_image, list(mon_datas))
+        final_link = await upload_png(png, "counters")
 
-        return final_link
\ No newline at end of file
+        if key is not None:
+            await counter_image_cache.put(key, png, final_link)
+        return final_link
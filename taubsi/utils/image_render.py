@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from io import BytesIO
+from typing import List, Union, Tuple
+
+from PIL import Image, ImageDraw
+
+COUNTER_MASK = "assets/counter.png"
+GYM_SIZE = 128
+SPRITE_CACHE_SIZE = 256
+
+# decoded and resized uicons by (hash of the file, size, mode)
+_sprites: OrderedDict[Tuple[str, int, Union[str, bool]], Image.Image] = OrderedDict()
+_sprites_lock = threading.Lock()
+
+# everything in here takes image bytes and returns PNG bytes without touching the bot,
+# so it can run in a thread or in another process
+
+
+def open_image(data: bytes, mode: Union[str, bool] = "RGBA") -> Image:
+    with BytesIO(data) as stream:
+        image = Image.open(stream).copy()
+        if mode:
+            image = image.convert(mode)
+    return image
+
+
+def to_png(image: Image) -> bytes:
+    with BytesIO() as stream:
+        image.save(stream, "PNG")
+        return stream.getvalue()
+
+
+@lru_cache(maxsize=16)
+def circle_mask(size: int) -> Image:
+    """
+    Drawn at twice the size and scaled down, so the edge is smooth
+    """
+    mask = Image.new("L", (size * 2, size * 2), 0)
+    draw = ImageDraw.Draw(mask)
+    draw.ellipse((0, 0, size * 2 - 2, size * 2 - 2), fill=255)
+    return mask.resize((size, size), Image.ANTIALIAS)
+
+
+@lru_cache(maxsize=1)
+def counter_mask() -> Image:
+    return Image.open(COUNTER_MASK).convert("L")
+
+
+def sprite(data: bytes, size: int, mode: Union[str, bool] = "RGBA") -> Image:
+    """
+    A uicon scaled so its longer side is `size` pixels. Icons that are used often are only decoded once.
+    Callers must not change the returned image
+    """
+    key = (hashlib.sha1(data).hexdigest(), size, mode)
+    with _sprites_lock:
+        cached = _sprites.get(key)
+        if cached is not None:
+            _sprites.move_to_end(key)
+            return cached
+
+    mon = open_image(data, mode)
+    multiplier = size / max(mon.size)
+    mon_size = tuple([int(round(multiplier * s)) for s in mon.size])
+    mon = mon.resize(mon_size, Image.ANTIALIAS)
+
+    with _sprites_lock:
+        _sprites[key] = mon
+        while len(_sprites) > SPRITE_CACHE_SIZE:
+            _sprites.popitem(last=False)
+    return mon
+
+
+def render_raid_image(gym_data: bytes, mon_data: bytes, boss_size: int) -> bytes:
+    """
+    A circular gym image with the boss in front of it.
+    Similiar to how it'd show on the in-game nearby view.
+    """
+    gym_img = open_image(gym_data)
+    mon = sprite(mon_data, boss_size)
+
+    # gym resizing. the image is scaled down before cutting the circle, so the mask can be reused
+    size = min(gym_img.size)
+    gym_img = gym_img.crop(((gym_img.width - size) // 2,
+                            (gym_img.height - size) // 2,
+                            (gym_img.width + size) // 2,
+                            (gym_img.height + size) // 2))
+    gym_img = gym_img.resize((GYM_SIZE, GYM_SIZE), Image.ANTIALIAS)
+    gym_img.putalpha(circle_mask(GYM_SIZE))
+
+    bg = Image.new("RGBA", (150, 150), 0)
+    bg.paste(gym_img)
+
+    # boss combining
+    monbg = Image.new("RGBA", bg.size, 0)
+    monbg.paste(mon, (bg.size[0] - mon.width, bg.size[1] - mon.height))
+
+    return to_png(Image.alpha_composite(bg, monbg))
+
+
+def render_counter(mon_data: bytes) -> Image:
+    mask = counter_mask()
+    mon = sprite(mon_data, 120, mode=False)
+
+    background = Image.new("RGBA", mask.size, (255, 0, 0, 0))
+
+    position_x = (mask.size[0] - mon.size[0]) // 2
+    position_y = (mask.size[1] - mon.size[1]) // 2
+
+    background.paste(mon, (position_x + 10, position_y + 10))
+
+    # replace transparent pixels with color
+    alpha = background.convert('RGBA').split()[-1]
+    bg = Image.new("RGBA", background.size, (37, 38, 41, 255))
+    bg.paste(background, mask=alpha)
+
+    bg.putalpha(mask)
+
+    return bg
+
+
+def render_counter_image(mon_datas: List[bytes]) -> bytes:
+    """
+    Counter sprites next to each other
+    """
+    mons = [render_counter(data) for data in mon_datas]
+
+    margin = 10
+    width = len(mons) * mons[0].size[0] + ((len(mons) - 1) * margin)
+
+    height = mons[0].size[1]
+    end_result = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+
+    pos = 0
+    for mon in mons:
+        end_result.paste(mon, (pos, 0))
+        pos += mon.size[0] + margin
+
+    return to_png(end_result)
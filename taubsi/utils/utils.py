@@ -1,19 +1,19 @@
-import aiohttp
 from math import floor
 
+from taubsi.utils import http
+
 
 def reverse_get(dict_, value):
     return list(dict_.keys())[list(dict_.values()).index(value)]
 
 
 async def asyncget(url, as_json=False, as_text=False):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as resp:
-            if as_json:
-                return await resp.json()
-            if as_text:
-                return await resp.text()
-            return await resp.read()
+    response = await http.request("GET", url)
+    if as_json:
+        return response.json()
+    if as_text:
+        return response.text()
+    return response.body
 
 
 def calculate_cp(level, basestats, iv):